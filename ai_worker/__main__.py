@@ -1,55 +1,70 @@
 import asyncio
-from aio_pika import connect
-from aio_pika.exceptions import AMQPConnectionError
-from aio_pika.abc import AbstractChannel, AbstractExchange
+from aio_pika import ExchangeType
+from aio_pika.abc import AbstractChannel
 
 from src.message_handler import message_handler
+from src.cancellation import CancelledJobs
+from src.monitoring import start_metrics_exporter
 from src.configs import settings
 
 
 from common_utils.log_util import setup_file_logger
+from common_utils.publisher import RabbitPublisher, connect_with_retry
+from common_utils.schemas import set_default_codec
 
 
 logger = setup_file_logger(
     name="ai_setup_logger", log_file="ai_setup_logger.log")
 
 async def setup_source(
-    channel: AbstractChannel, exchange: AbstractExchange, source: str
+    channel: AbstractChannel, publisher: RabbitPublisher, source: str
 ):
     in_queue = await channel.declare_queue(f"incoming_{source}", durable=True)
     out_queue = await channel.declare_queue(f"outgoing_{source}")
-
-    await in_queue.consume(
-        message_handler(out_exchange=exchange, out_queue=out_queue), no_ack=True
+    broadcast_exchange = await channel.declare_exchange(
+        f"broadcast_{source}", ExchangeType.FANOUT, durable=True
     )
 
-async def connect_with_retry(url, retries=5, delay=6):
-    for attempt in range(1, retries + 1):
-        try:
-            return await connect(url)
-        except (ConnectionRefusedError, AMQPConnectionError) as e:
-            if attempt == retries:
-                raise
-            logger.info(f"Rabbit not ready, retry #{attempt} in {delay}s...")
-            await asyncio.sleep(delay)
+    # Every worker receives all cancellations
+    cancelled_jobs = CancelledJobs(ttl=settings.worker.cancellation_ttl)
+    cancel_exchange = await channel.declare_exchange(f"cancel_{source}", ExchangeType.FANOUT, durable=True)
+    cancel_queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+    await cancel_queue.bind(cancel_exchange)
+    await cancel_queue.consume(cancelled_jobs.on_message, no_ack=True)
 
+    await in_queue.consume(
+        message_handler(
+            publisher=publisher,
+            out_routing_key=out_queue.name,
+            broadcast_exchange=broadcast_exchange.name,
+            cancelled_jobs=cancelled_jobs,
+        )
+    )
 
 
 async def main():
+    set_default_codec(settings.rabbit.codec)
+    start_metrics_exporter()
     logger.info("Establishing a connection with RabbitMQ ....")
-    connection = await connect_with_retry(settings.rabbit.url)
+    connection = await connect_with_retry(settings.rabbit.url, delay=6)
     logger.info(f"Connection is ready")
 
     async with connection:
 
         channel = await connection.channel()
-        exchange = channel.default_exchange
+        # The broker delivers no more unacked messages than the worker is allowed to process at once
+        await channel.set_qos(prefetch_count=settings.worker.max_concurrent_queries)
+        publisher = RabbitPublisher(
+            settings.rabbit.url, pool_size=settings.rabbit.publisher_pool_size, connection=connection,
+            on_return_raises=True,
+        )
+        await publisher.connect()
         if settings.rabbit.queue_prefix is not None:
             prefix = settings.rabbit.queue_prefix
         else:
             prefix = ""
         await asyncio.gather(
-            setup_source(channel, exchange, f"{prefix}"),
+            setup_source(channel, publisher, f"{prefix}"),
         )
 
         await asyncio.Future()
@@ -0,0 +1,58 @@
+import time
+import uuid
+from dataclasses import dataclass, field
+
+
+TRACE_ID_HEADER = "x-trace-id"
+# Stamps travel as integer microseconds: AMQP tables carry python floats as 32-bit floats,
+# which round epoch seconds to about two minutes
+TRACE_STAMPS_HEADER = "x-trace-stamps-us"
+
+# Stages of a recognition request: name -> (start stamp, end stamp)
+STAGES = {
+    "api": ("api_received", "api_published"),
+    "queue": ("api_published", "worker_received"),
+    "lyrics": ("worker_received", "lyrics_done"),
+    "llm": ("lyrics_done", "llm_done"),
+    "worker": ("llm_done", "worker_published"),
+    "reply_queue": ("worker_published", "api_reply_received"),
+    "delivery": ("api_reply_received", "delivered"),
+}
+
+
+@dataclass
+class TraceContext:
+    """
+    Timing of a recognition request, carried in AMQP headers from the API to the worker and back.
+    Every hop stamps the wall clock time of the events it handles.
+    """
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    stamps: dict[str, float] = field(default_factory=dict)
+
+    def stamp(self, name: str, at: float | None = None) -> "TraceContext":
+        self.stamps[name] = time.time() if at is None else at
+        return self
+
+    def to_headers(self) -> dict:
+        return {
+            TRACE_ID_HEADER: self.trace_id,
+            TRACE_STAMPS_HEADER: {name: round(value * 1_000_000) for name, value in self.stamps.items()},
+        }
+
+    @classmethod
+    def from_headers(cls, headers: dict | None) -> "TraceContext | None":
+        if not headers or TRACE_ID_HEADER not in headers:
+            return None
+        trace_id = headers[TRACE_ID_HEADER]
+        if isinstance(trace_id, bytes):
+            trace_id = trace_id.decode()
+        stamps = headers.get(TRACE_STAMPS_HEADER) or {}
+        return cls(trace_id=str(trace_id), stamps={name: int(value) / 1_000_000 for name, value in stamps.items()})
+
+    def breakdown(self) -> dict[str, float]:
+        """Duration of every stage with both stamps, in milliseconds"""
+        return {
+            stage: round((self.stamps[end] - self.stamps[start]) * 1000, 1)
+            for stage, (start, end) in STAGES.items()
+            if start in self.stamps and end in self.stamps
+        }
@@ -0,0 +1,35 @@
+import time
+
+from aio_pika.abc import AbstractIncomingMessage
+
+from common_utils.schemas import Message
+from common_utils.log_util import setup_file_logger
+
+
+logger = setup_file_logger(
+    name="ai_cancellation_logger", log_file="ai_cancellation_logger.log")
+
+
+class CancelledJobs:
+    """Requests cancelled by the API, remembered for `ttl` seconds (longer than a job can live)"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._jobs: dict[tuple[str, str], float] = {}
+
+    def cancel(self, chat_id: str, message_ids: list[str]):
+        now = time.monotonic()
+        for key in [key for key, expires_at in self._jobs.items() if expires_at <= now]:
+            del self._jobs[key]
+        for message_id in message_ids:
+            self._jobs[(chat_id, message_id)] = now + self.ttl
+
+    def is_cancelled(self, chat_id: str, message_id: str) -> bool:
+        expires_at = self._jobs.get((chat_id, message_id))
+        return expires_at is not None and expires_at > time.monotonic()
+
+    async def on_message(self, message: AbstractIncomingMessage) -> None:
+        msg = Message.from_rabbit_message(message)
+        if msg.is_cancel_message():
+            logger.info(f"Cancelled requests of {msg.chat_id}: {msg.message_ids}")
+            self.cancel(msg.chat_id, msg.message_ids)
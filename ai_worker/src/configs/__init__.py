@@ -4,12 +4,16 @@ from src.configs.base import BaseApplicationSettings
 from src.configs.ai import AISettings
 from src.configs.rabbit import RabbitSettings
 from src.configs.texts_api import RegogniseApiSettings
+from src.configs.worker import WorkerSettings
+from src.configs.database import MongoSettings
 
 
 class ApplicationSettings(BaseApplicationSettings):
     ai: ClassVar[AISettings] = AISettings()
     rabbit: ClassVar[RabbitSettings] = RabbitSettings()
     recognize: ClassVar[RegogniseApiSettings] = RegogniseApiSettings()
+    worker: ClassVar[WorkerSettings] = WorkerSettings()
+    database: ClassVar[MongoSettings] = MongoSettings()
 
 
 settings = ApplicationSettings()
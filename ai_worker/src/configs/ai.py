@@ -1,10 +1,24 @@
 from pydantic_settings import SettingsConfigDict
 
 from src.configs.base import BaseApplicationSettings
+from src.engine.enums import AnalysisMode, CountryExtraction, LLMBackend
 
 
 class AISettings(BaseApplicationSettings):
     model: str = "gpt-4o-2024-08-06"
     token: str
     proxy_url: str = ""
+    # OpenAI-compatible endpoint, e.g. the fake server of benchmarks/loadtest
+    base_url: str = ""
+    analysis_mode: AnalysisMode = AnalysisMode.SEPARATE
+    structured_repair_attempts: int = 1
+    country_extraction: CountryExtraction = CountryExtraction.LLM
+    backend: LLMBackend = LLMBackend.AUTOGEN
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    request_timeout: float = 60
+    # stream the summary to the client while it is generated (separate analysis mode only)
+    streaming: bool = False
+    # minimal seconds between two partial messages of one response
+    stream_interval: float = 0.2
     model_config = SettingsConfigDict(env_prefix="AI_")
@@ -0,0 +1,11 @@
+from pydantic_settings import SettingsConfigDict
+
+from src.configs.base import BaseApplicationSettings
+
+
+class MongoSettings(BaseApplicationSettings):
+    """Results database, used by the cache pre-warming command only"""
+    db_name: str = "lyrics"
+    db_url: str = "mongodb://localhost:27017"
+    collection_name: str = "responses_data"
+    model_config = SettingsConfigDict(env_prefix="MONGO_")
@@ -5,4 +5,29 @@ from src.configs.base import BaseApplicationSettings
 
 class RegogniseApiSettings(BaseApplicationSettings):
     lyrics_url: str = "https://api.lyrics.ovh/v1"
+    timeout: float = 10
+    retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 4
+    max_connections: int = 20
+    dns_cache_ttl: int = 300
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30
+    lyrics_max_chars: int = 300
+    lyrics_store_path: str = "/data/lyrics.sqlite3"
+    lyrics_store_max_entries: int = 100000
+    # providers asked in order, e.g. RECOGNIZE_LYRICS_PROVIDERS='["store", "api", "corpus"]',
+    # a provider listed twice sends a duplicate (hedged) request
+    lyrics_providers: list[str] = ["store", "api", "corpus"]
+    # jsonl file with artist, title and lyrics; the corpus provider is skipped if it is not set
+    lyrics_corpus_path: str = ""
+    # start the next provider when the running one is slower than its usual response time
+    hedging: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_delay: float = 0.05
+    hedge_max_delay: float = 5
+    # delay used until a provider has hedge_min_samples response times
+    hedge_initial_delay: float = 2
+    hedge_min_samples: int = 20
+    hedge_window: int = 200
     model_config = SettingsConfigDict(env_prefix="RECOGNIZE_")
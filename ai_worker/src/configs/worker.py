@@ -0,0 +1,13 @@
+from pydantic_settings import SettingsConfigDict
+
+from src.configs.base import BaseApplicationSettings
+
+
+class WorkerSettings(BaseApplicationSettings):
+    max_concurrent_queries: int = 4
+    query_timeout: float = 200
+    # how long cancellations from the API are remembered
+    cancellation_ttl: float = 900
+    # port of the prometheus /metrics exporter, 0 - disabled
+    metrics_port: int = 9100
+    model_config = SettingsConfigDict(env_prefix="WORKER_")
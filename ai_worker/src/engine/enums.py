@@ -1,4 +1,27 @@
 from enum import Enum, auto
 
 class QueryStatus(Enum):
-    WAITING_FOR_RESPONSE = auto()
\ No newline at end of file
+    WAITING_FOR_RESPONSE = auto()
+
+
+class AnalysisMode(str, Enum):
+    # summary and countries are requested with two separate LLM calls
+    SEPARATE = "separate"
+    # summary and countries are requested with one LLM call returning a JSON object
+    STRUCTURED = "structured"
+
+
+class CountryExtraction(str, Enum):
+    # countries are requested from the LLM (see AnalysisMode)
+    LLM = "llm"
+    # countries are found by the local gazetteer, the LLM only writes the summary
+    GAZETTEER = "gazetteer"
+    # the LLM is asked for countries only if the gazetteer finds some in the lyrics
+    PREFILTER = "prefilter"
+
+
+class LLMBackend(str, Enum):
+    # autogen agents built for every query
+    AUTOGEN = "autogen"
+    # shared AsyncOpenAI client with pooled connections
+    OPENAI = "openai"
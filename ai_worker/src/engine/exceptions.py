@@ -0,0 +1,6 @@
+class QueryCancelled(Exception):
+    """Nobody waits for the result of the query anymore"""
+
+
+class LyricsUnavailable(Exception):
+    """The lyrics could not be fetched right now, unlike a song without lyrics this is not a final answer"""
@@ -1,32 +1,99 @@
+import asyncio
+import random
+from urllib.parse import quote
+
 import aiohttp
-from aiohttp import ClientTimeout
+from aiohttp import ClientTimeout, TCPConnector
 from src.configs import settings
+from src.engine.circuit_breaker import CircuitBreaker
+from src.engine.exceptions import LyricsUnavailable
 from common_utils.log_util import setup_file_logger
 
 
 logger = setup_file_logger(
     name="ai_functions_logger", log_file="ai_functions_logger.log")
 
-async def get_lyrics(title: str, artist: str) -> str | None:
-    """Function to retrieve lyrics from API"""
+# Statuses worth retrying: rate limiting and server side errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LyricsApiError(Exception):
+    pass
+
+
+class LyricsClient:
+    """Client of the lyrics API with a shared connection pool, retries and a circuit breaker"""
+
+    def __init__(self) -> None:
+        self._session: aiohttp.ClientSession | None = None
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.recognize.breaker_failure_threshold,
+            reset_timeout=settings.recognize.breaker_reset_timeout,
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(
+                limit=settings.recognize.max_connections,
+                ttl_dns_cache=settings.recognize.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=ClientTimeout(total=settings.recognize.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _request(self, lyrics_url: str) -> str | None:
+        async with self._get_session().get(url=lyrics_url) as response:
+            status = response.status
+            if status == 200:
+                result = await response.json()
+                return result.get('lyrics')
+            if status in RETRY_STATUSES:
+                raise LyricsApiError(f'RECOGNITION API RESPONSE STATUS CODE - {status}: {await response.text()}')
+            logger.error(f'RECOGNITION API RESPONSE STATUS CODE - {status}')
+            return None
+
+    async def get_lyrics(self, title: str, artist: str) -> str | None:
+        """
+        Function to retrieve lyrics from API
+        :return: lyrics or None if the API does not know the song
+        :raises LyricsUnavailable: the circuit is open or all retries have failed
+        """
+
+        if not self.breaker.allow_request():
+            logger.error('RECOGNITION API CIRCUIT IS OPEN, SKIPPING REQUEST')
+            raise LyricsUnavailable('The lyrics API circuit is open')
 
-    lyrics_url = f'{settings.recognize.lyrics_url}/{artist.lower()}/{title.lower()}'
-    timeout = ClientTimeout(total=10)
-    async with aiohttp.ClientSession() as session:
+        lyrics_url = (f'{settings.recognize.lyrics_url}/'
+                      f'{quote(artist.lower(), safe="")}/{quote(title.lower(), safe="")}')
+        attempt = 0
+        succeeded = False
         try:
-            async with session.get(
-                    url=lyrics_url, timeout=timeout,
-                ) as response:
-                    status = response.status
-                    if status == 200:
-                        result = await response.json()
-                        lyrics = result.get('lyrics')
-                    else:
-                        logger.error(f'RECOGNITION API RESPONSE STATUS CODE - {status}')
-                        lyrics = None
-        except Exception as e:
-            text = await response.text()
-            logger.info(f"RESPONSE FROM API - {text}")
-            logger.error(f'EXCEPTION IN RETRIEVING HITS DATA - {e}')
-            lyrics = None
-    return lyrics[:300] if isinstance(lyrics, str) else lyrics
+            while True:
+                try:
+                    lyrics = await self._request(lyrics_url)
+                    succeeded = True
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, LyricsApiError) as e:
+                    logger.error(f'EXCEPTION IN RETRIEVING HITS DATA - {e!r}')
+                    if attempt >= settings.recognize.retries:
+                        raise LyricsUnavailable(f'The lyrics API failed {attempt + 1} times') from e
+                    # full jitter backoff
+                    delay = random.uniform(
+                        0, min(settings.recognize.backoff_max, settings.recognize.backoff_base * 2 ** attempt)
+                    )
+                    attempt += 1
+                    logger.info(f'RECOGNITION API RETRY #{attempt} in {delay:.2f}s')
+                    await asyncio.sleep(delay)
+        finally:
+            # every outcome is recorded, unexpected errors and cancellation count as failures,
+            # otherwise a half-open circuit would wait for its trial call forever
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        return lyrics
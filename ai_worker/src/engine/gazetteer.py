@@ -0,0 +1,107 @@
+import json
+from collections import deque
+from functools import cache
+from pathlib import Path
+from typing import Generic, Iterator, TypeVar
+
+
+GAZETTEER_PATH = Path(__file__).parent / "data" / "countries.json"
+# Aliases that are ordinary words or first names as well, they count only when written exactly like this
+EXACT_CASE_ALIASES = {
+    "US", "the States", "Chad", "Jordan", "Georgia", "Turkey", "China", "Guinea", "Niger",
+    "Polish", "Pole", "Poles", "Swede", "Swedes", "Panama",
+}
+
+T = TypeVar("T")
+
+
+class AhoCorasick(Generic[T]):
+    """Finds all occurrences of many patterns in one pass over the text"""
+
+    def __init__(self, patterns: dict[str, T]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[tuple[int, T]]] = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((len(pattern), value))
+
+        # breadth-first, so the failure state of every parent is known before its children
+        # (children of the root fail back to the root)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def search(self, text: str) -> Iterator[tuple[int, int, T]]:
+        """
+        :return: start, end and value of every occurrence, overlapping ones included
+        """
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._output[state]:
+                yield position - length + 1, position + 1, value
+
+
+def _lower(text: str) -> str:
+    """Lowercase keeping the length of the text, so that match positions point into the original"""
+    return "".join(lowered if len(lowered := char.lower()) == 1 else char for char in text)
+
+
+class CountryExtractor:
+    """
+    Finds countries mentioned by name, demonym or common alias (the gazetteer maps ISO 3166-1 alpha-2 codes
+    to the canonical name followed by its aliases) and returns the canonical names in order of appearance.
+    Only whole words match, and where matches overlap the longest one wins ('South Sudan', not 'Sudan').
+    """
+
+    def __init__(self, gazetteer: dict[str, list[str]]):
+        patterns = {}
+        for code, names in gazetteer.items():
+            for alias in names:
+                patterns[_lower(alias)] = (names[0], alias if alias in EXACT_CASE_ALIASES else None)
+        self._automaton = AhoCorasick(patterns)
+
+    @staticmethod
+    def _is_word(text: str, start: int, end: int) -> bool:
+        return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+    def extract(self, text: str) -> list[str]:
+        matches = []
+        for start, end, (country, exact) in self._automaton.search(_lower(text)):
+            if self._is_word(text, start, end) and (exact is None or text[start:end] == exact):
+                matches.append((start, end, country))
+
+        countries = []
+        covered_until = 0
+        for start, end, country in sorted(matches, key=lambda match: (match[0], -match[1])):
+            if start < covered_until:
+                continue
+            covered_until = end
+            if country not in countries:
+                countries.append(country)
+        return countries
+
+
+@cache
+def load_country_extractor() -> CountryExtractor:
+    """The bundled gazetteer is compiled once per process"""
+    with GAZETTEER_PATH.open(encoding="utf-8") as gazetteer:
+        return CountryExtractor(json.load(gazetteer))
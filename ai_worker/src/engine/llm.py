@@ -0,0 +1,161 @@
+import copy
+from abc import ABC, abstractmethod
+from functools import cache
+from typing import AsyncIterator
+
+import httpx
+from httpx_socks import AsyncProxyTransport, SyncProxyTransport
+from openai import AsyncOpenAI
+from autogen import UserProxyAgent, AssistantAgent
+from pydantic import BaseModel
+
+from src.configs import settings
+from src.engine.enums import LLMBackend
+
+# Schema keywords strict structured outputs do not accept, the answer is validated locally anyway
+UNSUPPORTED_SCHEMA_KEYWORDS = {"title", "default", "minLength", "maxLength"}
+
+
+class MyHttpClient(httpx.Client):
+    def __deepcopy__(self, memo):
+        return self
+
+
+@cache
+def strict_json_schema(model: type[BaseModel]) -> dict:
+    """JSON schema of the model in the form strict structured outputs accept: every property is required
+    and no other properties are allowed"""
+
+    def strict(node, is_properties: bool = False):
+        if isinstance(node, list):
+            return [strict(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        if is_properties:
+            # keys are property names here, not keywords
+            return {name: strict(value) for name, value in node.items()}
+        node = {key: strict(value, key == "properties") for key, value in node.items()
+                if key not in UNSUPPORTED_SCHEMA_KEYWORDS}
+        if node.get("type") == "object":
+            node["required"] = list(node.get("properties", {}))
+            node["additionalProperties"] = False
+        return node
+
+    return strict(model.model_json_schema())
+
+
+class LLMClient(ABC):
+
+    @abstractmethod
+    async def complete(
+        self, system_message: str, message: str, output_model: type[BaseModel] | None = None
+    ) -> str:
+        """Make a single-turn GPT query and return the text of the answer.
+        With output_model the answer is requested as JSON matching the model, as far as the backend can enforce it"""
+
+    async def stream(self, system_message: str, message: str) -> AsyncIterator[str]:
+        """Make a single-turn GPT query and yield the answer in chunks as it is generated.
+        Backends without streaming yield the whole answer at once"""
+        yield await self.complete(system_message, message)
+
+    async def close(self):
+        pass
+
+
+class AutogenClient(LLMClient):
+    """Builds autogen agents for every query"""
+
+    def __init__(self) -> None:
+        self.http_client = None
+        if settings.ai.proxy_url:
+            transport = SyncProxyTransport.from_url(settings.ai.proxy_url)
+            self.http_client = MyHttpClient(transport=transport)
+
+        config = {"model": settings.ai.model, "api_key": settings.ai.token, "http_client": self.http_client}
+        if settings.ai.base_url:
+            config["base_url"] = settings.ai.base_url
+        self.llm_config = {"config_list": [config], "temperature": 0.0}
+
+    async def complete(
+        self, system_message: str, message: str, output_model: type[BaseModel] | None = None
+    ) -> str:
+        # autogen takes no response format, the prompt asks for JSON and the caller validates it
+        user_proxy = UserProxyAgent(
+            name="user_proxy",
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=0,
+            llm_config=copy.deepcopy(self.llm_config)
+        )
+
+        agent = AssistantAgent(
+            name="func_execution_agent",
+            llm_config=copy.deepcopy(self.llm_config),
+            system_message=system_message,
+        )
+
+        chat = await user_proxy.a_initiate_chat(
+            agent, message=message, max_turns=1, summary_method="last_msg"
+        )
+        return chat.summary
+
+
+class OpenAIClient(LLMClient):
+    """Calls chat completions directly through one AsyncOpenAI client with a keep-alive connection pool"""
+
+    def __init__(self) -> None:
+        limits = httpx.Limits(
+            max_connections=settings.ai.max_connections,
+            max_keepalive_connections=settings.ai.max_keepalive_connections,
+        )
+        if settings.ai.proxy_url:
+            transport = AsyncProxyTransport.from_url(settings.ai.proxy_url, limits=limits)
+        else:
+            transport = httpx.AsyncHTTPTransport(limits=limits)
+        self.http_client = httpx.AsyncClient(transport=transport, timeout=settings.ai.request_timeout)
+        self.client = AsyncOpenAI(api_key=settings.ai.token, base_url=settings.ai.base_url or None,
+                                  http_client=self.http_client)
+
+    async def complete(
+        self, system_message: str, message: str, output_model: type[BaseModel] | None = None
+    ) -> str:
+        kwargs = {}
+        if output_model is not None:
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": output_model.__name__, "schema": strict_json_schema(output_model),
+                                "strict": True},
+            }
+        completion = await self.client.chat.completions.create(
+            model=settings.ai.model,
+            temperature=0.0,
+            messages=self._messages(system_message, message),
+            **kwargs,
+        )
+        return completion.choices[0].message.content or ""
+
+    async def stream(self, system_message: str, message: str) -> AsyncIterator[str]:
+        chunks = await self.client.chat.completions.create(
+            model=settings.ai.model,
+            temperature=0.0,
+            messages=self._messages(system_message, message),
+            stream=True,
+        )
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def _messages(system_message: str, message: str) -> list[dict]:
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": message},
+        ]
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_llm_client() -> LLMClient:
+    if settings.ai.backend == LLMBackend.OPENAI:
+        return OpenAIClient()
+    return AutogenClient()
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+
+from src.configs import settings
+from src.engine.exceptions import LyricsUnavailable
+from src.engine.functions import LyricsClient
+from src.engine.lyrics_store import LyricsStore
+from src.monitoring import lyrics_fetch_seconds, lyrics_hedged_requests, failures
+from common_utils.log_util import setup_file_logger
+from common_utils.normalize import song_key
+
+
+logger = setup_file_logger(
+    name="ai_lyrics_logger", log_file="ai_lyrics_logger.log")
+
+
+class LyricsProvider(ABC):
+    name: str
+
+    @abstractmethod
+    async def get_lyrics(self, artist: str, title: str) -> str | None:
+        """Full lyrics of the song or None if the provider does not have them"""
+
+    async def close(self):
+        pass
+
+
+class StoreLyricsProvider(LyricsProvider):
+    """Lyrics fetched before, kept in the local SQLite store"""
+    name = "store"
+
+    def __init__(self, store: LyricsStore):
+        self.store = store
+
+    async def get_lyrics(self, artist: str, title: str) -> str | None:
+        return await self.store.get(artist=artist, title=title)
+
+
+class ApiLyricsProvider(LyricsProvider):
+    """The lyrics API at settings.recognize.lyrics_url"""
+    name = "api"
+
+    def __init__(self, client: LyricsClient):
+        self.client = client
+
+    async def get_lyrics(self, artist: str, title: str) -> str | None:
+        return await self.client.get_lyrics(artist=artist, title=title)
+
+
+class CorpusLyricsProvider(LyricsProvider):
+    """
+    Lyrics from a local corpus file, one JSON object with "artist", "title" and "lyrics" per line.
+    The file is read into memory on the first request.
+    """
+    name = "corpus"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lyrics: dict[tuple[str, str], str] | None = None
+        self._lock = asyncio.Lock()
+
+    def _load(self) -> dict[tuple[str, str], str]:
+        lyrics = {}
+        with self.path.open(encoding="utf-8") as corpus:
+            for line in corpus:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                lyrics[song_key(record["artist"], record["title"])] = record["lyrics"]
+        logger.info(f"Loaded {len(lyrics)} songs from the lyrics corpus {self.path}")
+        return lyrics
+
+    async def get_lyrics(self, artist: str, title: str) -> str | None:
+        if self._lyrics is None:
+            async with self._lock:
+                if self._lyrics is None:
+                    self._lyrics = await asyncio.to_thread(self._load)
+        return self._lyrics.get(song_key(artist, title))
+
+
+class LatencyTracker:
+    """Sliding window of the latest response times of a provider"""
+
+    def __init__(self, window: int):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, share: float) -> float:
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class LyricsProviderChain:
+    """
+    Asks the providers in order, moving to the next one when a provider has no lyrics or fails.
+    With hedging enabled the next provider is also started when the running one has not answered
+    within its usual (quantile of the recent response times) delay and the first lyrics found win.
+    So only the slowest few percent of requests cost more than one provider call.
+    The slower requests are left to finish in the background: cancelling them would hide exactly
+    the response times the hedge delay has to account for.
+    A song counts as having no lyrics only if every provider answered so, when some of them failed
+    the lyrics are unavailable for now.
+    """
+
+    def __init__(self, providers: list[LyricsProvider]):
+        self.providers = providers
+        self._latencies = [LatencyTracker(settings.recognize.hedge_window) for _ in providers]
+        self._background: set[asyncio.Task] = set()
+
+    def hedge_delay(self, index: int) -> float:
+        latencies = self._latencies[index]
+        if len(latencies) < settings.recognize.hedge_min_samples:
+            return settings.recognize.hedge_initial_delay
+        return min(max(latencies.quantile(settings.recognize.hedge_quantile), settings.recognize.hedge_min_delay),
+                   settings.recognize.hedge_max_delay)
+
+    async def _ask(self, index: int, artist: str, title: str) -> tuple[str | None, bool]:
+        """
+        :return: lyrics of the provider and whether it failed
+        """
+        provider = self.providers[index]
+        started = time.monotonic()
+        failed = False
+        try:
+            with lyrics_fetch_seconds.labels(provider.name).time():
+                lyrics = await provider.get_lyrics(artist=artist, title=title)
+        except Exception as e:
+            logger.error(f"Lyrics provider {provider.name} failed for {artist} - {title}: {e!r}")
+            failures.labels(f"lyrics_{provider.name}").inc()
+            lyrics, failed = None, True
+        self._latencies[index].add(time.monotonic() - started)
+        return lyrics, failed
+
+    async def get_lyrics(self, artist: str, title: str) -> tuple[str | None, str | None]:
+        """
+        :return: lyrics and the name of the provider that found them, (None, None) if nobody has them
+        :raises LyricsUnavailable: no provider has found the lyrics and some of them have failed
+        """
+        pending: dict[asyncio.Task, int] = {}
+        next_index = 0
+
+        def start_next():
+            nonlocal next_index
+            task = asyncio.create_task(self._ask(next_index, artist, title))
+            pending[task] = next_index
+            next_index += 1
+
+        start_next()
+        found = False
+        failed_providers = []
+        try:
+            while pending:
+                timeout = None
+                if settings.recognize.hedging and next_index < len(self.providers):
+                    timeout = self.hedge_delay(next_index - 1)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    lyrics_hedged_requests.labels(self.providers[next_index].name).inc()
+                    start_next()
+                    continue
+                for task in done:
+                    index = pending.pop(task)
+                    lyrics, failed = task.result()
+                    if lyrics:
+                        found = True
+                        return lyrics, self.providers[index].name
+                    if failed:
+                        failed_providers.append(self.providers[index].name)
+                if next_index < len(self.providers):
+                    start_next()
+            if failed_providers:
+                raise LyricsUnavailable(f"Lyrics providers {', '.join(failed_providers)} failed")
+            return None, None
+        finally:
+            for task in pending:
+                if found:
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                else:
+                    # the caller has given up (timeout or cancelled job)
+                    task.cancel()
+
+    async def close(self):
+        for task in self._background:
+            task.cancel()
+        for provider in self.providers:
+            await provider.close()
+
+
+def create_lyrics_chain(store: LyricsStore, client: LyricsClient) -> LyricsProviderChain:
+    factories = {
+        StoreLyricsProvider.name: lambda: StoreLyricsProvider(store),
+        ApiLyricsProvider.name: lambda: ApiLyricsProvider(client),
+        CorpusLyricsProvider.name: lambda: CorpusLyricsProvider(settings.recognize.lyrics_corpus_path),
+    }
+    providers = []
+    for name in settings.recognize.lyrics_providers:
+        if name == CorpusLyricsProvider.name and not settings.recognize.lyrics_corpus_path:
+            continue
+        providers.append(factories[name]())
+    return LyricsProviderChain(providers)
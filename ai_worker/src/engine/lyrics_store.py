@@ -0,0 +1,79 @@
+import asyncio
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+from common_utils.normalize import song_key
+from common_utils.log_util import setup_file_logger
+
+
+logger = setup_file_logger(
+    name="ai_lyrics_store_logger", log_file="ai_lyrics_store_logger.log")
+
+
+class LyricsStore:
+    """
+    Persistent lyrics storage in a local SQLite file.
+    Full lyrics are stored zlib-compressed under the normalized artist/title,
+    the least recently used entries are evicted once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # all queries run in one worker thread at a time, see _run
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS lyrics ("
+            "artist_key TEXT NOT NULL, title_key TEXT NOT NULL, lyrics BLOB NOT NULL, "
+            "accessed_at REAL NOT NULL, PRIMARY KEY (artist_key, title_key))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS lyrics_accessed_at ON lyrics (accessed_at)")
+        self._connection.commit()
+        self._lock = asyncio.Lock()
+
+    async def _run(self, func, *args):
+        async with self._lock:
+            return await asyncio.to_thread(func, *args)
+
+    def _get(self, key: tuple[str, str]) -> str | None:
+        row = self._connection.execute(
+            "SELECT lyrics FROM lyrics WHERE artist_key = ? AND title_key = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        self._connection.execute(
+            "UPDATE lyrics SET accessed_at = ? WHERE artist_key = ? AND title_key = ?", (time.time(), *key)
+        )
+        self._connection.commit()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def _set(self, key: tuple[str, str], lyrics: str):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO lyrics (artist_key, title_key, lyrics, accessed_at) VALUES (?, ?, ?, ?)",
+            (*key, zlib.compress(lyrics.encode("utf-8")), time.time()),
+        )
+        self._connection.execute(
+            "DELETE FROM lyrics WHERE rowid IN ("
+            "SELECT rowid FROM lyrics ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._connection.commit()
+
+    async def get(self, artist: str, title: str) -> str | None:
+        try:
+            return await self._run(self._get, song_key(artist, title))
+        except sqlite3.Error as e:
+            logger.error(f"Error reading lyrics from the store: {e}")
+            return None
+
+    async def set(self, artist: str, title: str, lyrics: str):
+        try:
+            await self._run(self._set, song_key(artist, title), lyrics)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving lyrics to the store: {e}")
+
+    def close(self):
+        self._connection.close()
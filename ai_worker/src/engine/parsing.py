@@ -0,0 +1,48 @@
+import ast
+import json
+import re
+
+from pydantic import BaseModel, Field
+
+
+CODE_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+class LyricsAnalysis(BaseModel):
+    summary: str = Field(min_length=1)
+    countries: list[str] = Field(default_factory=list)
+
+
+def _strip_llm_text(text: str) -> str:
+    return CODE_FENCE_RE.sub("", text.strip())
+
+
+def _extract_block(text: str, opening: str, closing: str) -> str:
+    start = text.find(opening)
+    end = text.rfind(closing)
+    if start == -1 or end < start:
+        raise ValueError(f"No {opening}...{closing} block in LLM output: {text!r}")
+    return text[start:end + 1]
+
+
+def parse_analysis(text: str) -> LyricsAnalysis:
+    """
+    Parse the structured analysis returned by LLM, ignoring stray text around the JSON object.
+    Raises ValueError (or pydantic ValidationError) if the output does not match the schema
+    """
+    return LyricsAnalysis.model_validate_json(_extract_block(_strip_llm_text(text), "{", "}"))
+
+
+def parse_country_list(text: str) -> list[str]:
+    """Parse the country list returned by LLM. Accepts both JSON and python list literals"""
+    block = _extract_block(_strip_llm_text(text), "[", "]")
+    try:
+        countries = json.loads(block)
+    except json.JSONDecodeError:
+        try:
+            countries = ast.literal_eval(block)
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"Invalid country list in LLM output: {text!r}") from e
+    if not isinstance(countries, list):
+        raise ValueError(f"Invalid country list in LLM output: {text!r}")
+    return [str(country) for country in countries]
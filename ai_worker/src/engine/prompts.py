@@ -7,4 +7,14 @@ COUNTRY_CALCULATION_PROMPT = ("YOU WILL RECEIVE A TEXT WITH SONG LYRICS."
                               " YOUR TASK IS TO CREATE A VALID PYTHON LIST WITH THE"
                               " NAMES OF COUNTRIES THAT CAN BE IN THAT LYRICS. "
                               "RETURN AN EMPTY LIST IF THERE ARE NO COUNTRIES. "
-                              "DO NOT ADD ANY OTHER TEXT OR SYMBOLS APART FROM THAT LIST")
\ No newline at end of file
+                              "DO NOT ADD ANY OTHER TEXT OR SYMBOLS APART FROM THAT LIST")
+STRUCTURED_ANALYSIS_PROMPT = ("YOU WILL RECEIVE A TEXT WITH SONG LYRICS."
+                              " RETURN A JSON OBJECT WITH EXACTLY TWO KEYS:"
+                              ' "summary" - A SUMMARY OF THIS SONG IN ONE SENTENCE (NO MORE THAN 15 WORDS),'
+                              ' "countries" - A LIST WITH THE NAMES OF COUNTRIES THAT CAN BE IN THAT LYRICS'
+                              " (AN EMPTY LIST IF THERE ARE NO COUNTRIES)."
+                              " DO NOT ADD ANY OTHER TEXT OR SYMBOLS APART FROM THAT JSON OBJECT")
+JSON_REPAIR_PROMPT = ("YOU WILL RECEIVE A TEXT THAT SHOULD BE A JSON OBJECT WITH THE KEYS"
+                      ' "summary" (STRING) AND "countries" (LIST OF STRINGS) BUT IS MALFORMED.'
+                      " RETURN THE CORRECTED JSON OBJECT ONLY."
+                      " DO NOT ADD ANY OTHER TEXT OR SYMBOLS APART FROM THAT JSON OBJECT")
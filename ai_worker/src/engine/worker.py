@@ -1,92 +1,198 @@
-import copy
-import json
-
+import asyncio
+import time
 from typing import Callable, Awaitable
 
-import httpx
-from httpx_socks import AsyncProxyTransport, SyncProxyTransport
-from src.configs import settings
-from autogen import UserProxyAgent, AssistantAgent
-
-from src.engine.enums import QueryStatus
-from src.engine.functions import get_lyrics
-
-from src.engine.prompts import LYRICS_ANALYSIS_PROMPT, COUNTRY_CALCULATION_PROMPT
+from pydantic import BaseModel
 
-from common_utils.log_util import setup_file_logger
+from src.configs import settings
+from src.engine.enums import QueryStatus, AnalysisMode, CountryExtraction
+from src.engine.exceptions import QueryCancelled, LyricsUnavailable
+from src.monitoring import llm_call_seconds, llm_first_token_seconds, failures
+from src.engine.functions import LyricsClient
+from src.engine.lyrics_store import LyricsStore
+from src.engine.lyrics_providers import create_lyrics_chain, StoreLyricsProvider
+from src.engine.llm import create_llm_client
+from src.engine.parsing import LyricsAnalysis, parse_analysis, parse_country_list
+from src.engine.gazetteer import load_country_extractor
+
+from src.engine.prompts import (
+    LYRICS_ANALYSIS_PROMPT,
+    COUNTRY_CALCULATION_PROMPT,
+    STRUCTURED_ANALYSIS_PROMPT,
+    JSON_REPAIR_PROMPT,
+)
+
+from common_utils.log_util import setup_file_logger, SAMPLED
+from common_utils.results import NO_LYRICS_RESPONSE
+from common_utils.tracing import TraceContext
 
 
 logger = setup_file_logger(
     name="ai_logger", log_file="ai_logger.log")
 
-class MyHttpClient(httpx.Client):
-    def __deepcopy__(self, memo):
-        return self
-
 class Engine:
 
     def __init__(
         self
     ) -> None:
-        self.http_client = None
-        if settings.ai.proxy_url:
-            transport = SyncProxyTransport.from_url(settings.ai.proxy_url)
-            self.http_client = MyHttpClient(transport=transport)
-
-        self.llm_config = {"config_list": [{"model": settings.ai.model, "api_key": settings.ai.token, "http_client": self.http_client}], "temperature": 0.0}
+        self.llm = create_llm_client()
+        self.lyrics_client = LyricsClient()
+        self.lyrics_store = LyricsStore(
+            path=settings.recognize.lyrics_store_path,
+            max_entries=settings.recognize.lyrics_store_max_entries,
+        )
+        self.lyrics_providers = create_lyrics_chain(store=self.lyrics_store, client=self.lyrics_client)
+        self.country_extractor = load_country_extractor()
+
+    async def close(self):
+        await self.llm.close()
+        await self.lyrics_providers.close()
+        await self.lyrics_client.close()
+        self.lyrics_store.close()
+
+    async def get_lyrics(self, artist: str, title: str) -> str | None:
+        """
+        Get full lyrics from the chain of lyrics providers, keeping them in the local store
+        :raises LyricsUnavailable: the lyrics could not be fetched right now, the song is not known to have none
+        """
+
+        try:
+            lyrics, source = await self.lyrics_providers.get_lyrics(artist=artist, title=title)
+        except LyricsUnavailable:
+            failures.labels("lyrics").inc()
+            raise
+        if not lyrics:
+            failures.labels("lyrics").inc()
+        elif source != StoreLyricsProvider.name:
+            await self.lyrics_store.set(artist=artist, title=title, lyrics=lyrics)
+        return lyrics
 
     async def query(
-        self, artist: str, title: str, status_callback: Callable[[QueryStatus], Awaitable[None]]
+        self,
+        artist: str,
+        title: str,
+        status_callback: Callable[[QueryStatus], Awaitable[None]],
+        is_cancelled: Callable[[], bool] = lambda: False,
+        trace: TraceContext | None = None,
+        partial_callback: Callable[[str], Awaitable[None]] | None = None,
     ) -> dict:
-        """Make GPT queries"""
+        """
+        Make GPT queries
+        :param is_cancelled: checked before the expensive stages, QueryCancelled is raised if it returns True
+        :param trace: timing context of the request, stamped when lyrics and LLM stages are done
+        :param partial_callback: receives the summary generated so far if streaming is enabled
+        """
+        trace = trace or TraceContext()
 
         await status_callback(QueryStatus.WAITING_FOR_RESPONSE)
 
-        default_response = "Could not retrieve track lyrics. Try again later"
-
-        lyrics = await get_lyrics(artist=artist, title=title)
-        logger.info(f'PROVIDED LYRICS - {lyrics}')
+        if is_cancelled():
+            raise QueryCancelled
+        lyrics = await self.get_lyrics(artist=artist, title=title)
+        trace.stamp("lyrics_done")
+        logger.info(f'PROVIDED LYRICS - {lyrics}', extra=SAMPLED)
         if not lyrics:
-            return {"response": default_response, "countries": []}
-
-        user_proxy = UserProxyAgent(
-            name="user_proxy",
-            human_input_mode="NEVER",
-            max_consecutive_auto_reply=0,
-            llm_config=copy.deepcopy(self.llm_config)
-        )
-
-        lyrics_analysis_agent = AssistantAgent(
-            name="func_execution_agent",
-            llm_config=copy.deepcopy(self.llm_config),
-            system_message=LYRICS_ANALYSIS_PROMPT,
-        )
-
-        country_calculation_agent = AssistantAgent(
-            name="func_execution_agent",
-            llm_config=copy.deepcopy(self.llm_config),
-            system_message=COUNTRY_CALCULATION_PROMPT,
-        )
-
-
-        lyrics_analysis = await user_proxy.a_initiate_chat(
-            lyrics_analysis_agent, message=lyrics, max_turns=1, summary_method="last_msg"
-        )
+            return {"response": NO_LYRICS_RESPONSE, "countries": []}
+        lyrics = lyrics[:settings.recognize.lyrics_max_chars]
+
+        if is_cancelled():
+            raise QueryCancelled
+
+        result = await self._analyse(lyrics, partial_callback)
+        trace.stamp("llm_done")
+        return result
+
+    async def _analyse(self, lyrics: str, partial_callback: Callable[[str], Awaitable[None]] | None = None) -> dict:
+        if settings.ai.country_extraction != CountryExtraction.LLM:
+            countries = self.country_extractor.extract(lyrics)
+            if settings.ai.country_extraction == CountryExtraction.GAZETTEER or not countries:
+                summary = await self._summarise(lyrics, partial_callback)
+                logger.info(f'LYRICS ANALYSIS - {summary}.\n GAZETTEER COUNTRIES - {countries}', extra=SAMPLED)
+                return {"response": summary, "countries": countries}
+
+        if settings.ai.analysis_mode == AnalysisMode.STRUCTURED:
+            try:
+                return await self._analyse_structured(lyrics)
+            except Exception as e:
+                logger.error(f'STRUCTURED ANALYSIS FAILED, FALLING BACK TO SEPARATE CALLS - {e}')
+
+        return await self._analyse_separately(lyrics, partial_callback)
+
+    async def _ask(
+        self, stage: str, system_message: str, message: str, output_model: type[BaseModel] | None = None
+    ) -> str:
+        """Make a single-turn GPT query"""
+
+        try:
+            with llm_call_seconds.labels(stage).time():
+                return await self.llm.complete(system_message, message, output_model=output_model)
+        except Exception:
+            failures.labels(f"llm_{stage}").inc()
+            raise
+
+    async def _ask_streamed(
+        self, stage: str, system_message: str, message: str, partial_callback: Callable[[str], Awaitable[None]]
+    ) -> str:
+        """Make a single-turn GPT query, passing the text generated so far to partial_callback"""
+
+        text = ""
+        sent_at = None
+        started = time.monotonic()
+        try:
+            with llm_call_seconds.labels(stage).time():
+                async for chunk in self.llm.stream(system_message, message):
+                    if not text:
+                        llm_first_token_seconds.labels(stage).observe(time.monotonic() - started)
+                    text += chunk
+                    # the first chunk goes out right away, later ones at most every stream_interval
+                    if sent_at is None or time.monotonic() - sent_at >= settings.ai.stream_interval:
+                        sent_at = time.monotonic()
+                        await partial_callback(text)
+        except Exception:
+            failures.labels(f"llm_{stage}").inc()
+            raise
+        return text
+
+    async def _summarise(self, lyrics: str, partial_callback: Callable[[str], Awaitable[None]] | None = None) -> str:
+        if settings.ai.streaming and partial_callback is not None:
+            return await self._ask_streamed("summary", LYRICS_ANALYSIS_PROMPT, lyrics, partial_callback)
+        return await self._ask("summary", LYRICS_ANALYSIS_PROMPT, lyrics)
+
+    async def _analyse_separately(
+        self, lyrics: str, partial_callback: Callable[[str], Awaitable[None]] | None = None
+    ) -> dict:
+        """Request the summary and the country list with two GPT queries"""
 
-        country_list = await user_proxy.a_initiate_chat(
-            country_calculation_agent, message=lyrics, max_turns=1, summary_method="last_msg"
+        lyrics_analysis, country_list = await asyncio.gather(
+            self._summarise(lyrics, partial_callback),
+            self._ask("countries", COUNTRY_CALCULATION_PROMPT, lyrics),
         )
 
-        logger.info(f'LYRICS ANALYSIS - {lyrics_analysis.summary}.\n COUNTRY LIST - {country_list.summary}')
-
-        country_list = json.loads(country_list.summary)
-
+        logger.info(f'LYRICS ANALYSIS - {lyrics_analysis}.\n COUNTRY LIST - {country_list}', extra=SAMPLED)
 
         return {
-            "response": lyrics_analysis.summary, "countries": country_list
+            "response": lyrics_analysis, "countries": parse_country_list(country_list)
         }
 
+    async def _analyse_structured(self, lyrics: str) -> dict:
+        """Request the summary and the country list with one GPT query returning JSON"""
+
+        output = await self._ask("structured", STRUCTURED_ANALYSIS_PROMPT, lyrics, output_model=LyricsAnalysis)
+        logger.info(f'STRUCTURED ANALYSIS - {output}', extra=SAMPLED)
+
+        attempt = 0
+        while True:
+            try:
+                analysis = parse_analysis(output)
+                break
+            except ValueError as e:
+                # pydantic ValidationError is a ValueError as well
+                if attempt >= settings.ai.structured_repair_attempts:
+                    raise
+                attempt += 1
+                logger.info(f'INVALID STRUCTURED ANALYSIS, REPAIR ATTEMPT #{attempt} - {e}')
+                output = await self._ask("repair", JSON_REPAIR_PROMPT, output, output_model=LyricsAnalysis)
 
-
-
-
+        return {
+            "response": analysis.summary, "countries": analysis.countries
+        }
@@ -1,25 +1,66 @@
-from datetime import datetime
 import asyncio
-from aio_pika.abc import AbstractIncomingMessage, AbstractExchange, AbstractQueue
+from typing import Callable, Awaitable
+from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.exceptions import PublishError
 from common_utils.schemas import (
     Message,
     UserMessage,
     StatusMessage,
     ResponseMessage,
+    PartialMessage,
 )
-from common_utils.log_util import setup_file_logger
+from common_utils.log_util import setup_file_logger, SAMPLED
+from common_utils.results import FAILED_RESPONSE
+from common_utils.publisher import RabbitPublisher
+from common_utils.tracing import TraceContext
 from src.engine.worker import Engine
 from src.engine.enums import QueryStatus
+from src.engine.exceptions import QueryCancelled
+from src.cancellation import CancelledJobs
+from src.configs import settings
+from src.monitoring import in_flight_jobs, jobs, failures, queue_wait_seconds, publish_seconds
 
 logger = setup_file_logger(
     name="ai_message_logger", log_file="ai_message_logger.log")
 
 
+def create_reply_publisher(
+    incoming: AbstractIncomingMessage,
+    publisher: RabbitPublisher,
+    out_routing_key: str,
+    broadcast_exchange: str,
+):
+    """
+    Replies go to the queue of the API instance that sent the request (reply_to).
+    If that queue is gone (the instance has died) they are broadcast to all instances.
+    Requests without reply_to are answered through the shared outgoing queue.
+    """
+    async def reply(msg: Message, trace: TraceContext | None = None):
+        with publish_seconds.time():
+            await _reply(msg, trace.stamp("worker_published").to_headers() if trace is not None else None)
+
+    async def _reply(msg: Message, headers: dict | None):
+        if not incoming.reply_to:
+            await publisher.publish(msg.prepare(headers=headers), routing_key=out_routing_key)
+            return
+        try:
+            await publisher.publish(
+                msg.prepare(correlation_id=incoming.correlation_id, headers=headers), routing_key=incoming.reply_to
+            )
+        except PublishError:
+            logger.info(f"Reply queue {incoming.reply_to} is gone, broadcasting {incoming.correlation_id}")
+            await publisher.publish(
+                msg.prepare(correlation_id=incoming.correlation_id, headers=headers), routing_key="",
+                exchange_name=broadcast_exchange,
+            )
+
+    return reply
+
+
 def create_status_callback(
     chat_id: str,
     message_id: str,
-    out_exchange: AbstractExchange,
-    out_queue: AbstractQueue,
+    reply: Callable[..., Awaitable[None]],
 ):
     async def status_callback(status: QueryStatus):
         status_msg = None
@@ -31,38 +72,94 @@ def create_status_callback(
                 text=text,
             )
         if status_msg:
-            await out_exchange.publish(status_msg.prepare(), routing_key=out_queue.name)
+            await reply(status_msg)
 
     return status_callback
 
 
-def message_handler(out_exchange: AbstractExchange, out_queue: AbstractQueue):
+def create_partial_callback(
+    chat_id: str,
+    message_id: str,
+    reply: Callable[..., Awaitable[None]],
+):
+    async def partial_callback(text: str):
+        # partial texts are best effort, the full response follows anyway
+        try:
+            await reply(PartialMessage(chat_id=chat_id, user_message_id=message_id, text=text))
+        except Exception as e:
+            logger.error(f"{message_id} Failed to publish a partial response. Error {e}")
+            failures.labels("partial").inc()
+
+    return partial_callback
+
+
+def message_handler(
+    publisher: RabbitPublisher, out_routing_key: str, broadcast_exchange: str, cancelled_jobs: CancelledJobs
+):
     engine = Engine()
 
-    async def on_message(message: AbstractIncomingMessage) -> None:
+    async def process_message(message: AbstractIncomingMessage) -> None:
         msg = Message.from_rabbit_message(message)
         if isinstance(msg, UserMessage):
+            trace = (TraceContext.from_headers(message.headers) or TraceContext()).stamp("worker_received")
+            reply = create_reply_publisher(message, publisher, out_routing_key, broadcast_exchange)
             logger.info(f"Received message: {msg.message_id} {msg.title} {msg.artist}")
+            # the AMQP timestamp has whole seconds only, the publish stamp of the trace is precise
+            if "api_published" in trace.stamps:
+                queue_wait = trace.stamps["worker_received"] - trace.stamps["api_published"]
+                if queue_wait >= 0:
+                    queue_wait_seconds.observe(queue_wait)
+                else:
+                    # clock skew between the hosts or a corrupted stamp, not a short wait
+                    logger.error(f"{msg.message_id} Negative queue wait {queue_wait:.3f}s, not recorded")
+                    failures.labels("queue_wait_skew").inc()
+
+            def is_cancelled():
+                return cancelled_jobs.is_cancelled(msg.chat_id, msg.message_id)
+
             try:
+                if is_cancelled():
+                    raise QueryCancelled
                 process_coro = engine.query(
                     artist=msg.artist,
                     title=msg.title,
-                    status_callback=create_status_callback(
-                        msg.chat_id, msg.message_id, out_exchange, out_queue
-                    ),
+                    status_callback=create_status_callback(msg.chat_id, msg.message_id, reply),
+                    is_cancelled=is_cancelled,
+                    trace=trace,
+                    partial_callback=create_partial_callback(msg.chat_id, msg.message_id, reply),
                 )
-                task = asyncio.wait_for(process_coro, timeout=200)
+                task = asyncio.wait_for(process_coro, timeout=settings.worker.query_timeout)
                 result: dict = await task
+            except QueryCancelled:
+                logger.info(f"{msg.message_id} is cancelled, skipping")
+                jobs.labels("cancelled").inc()
+                return
             except Exception as e:
                 logger.error(f"Failed to process message. Error {e}")
-                result = {"response": "Something went wrong. Try again later", "countries": []}
+                failures.labels("query").inc()
+                jobs.labels("failed").inc()
+                result = {"response": FAILED_RESPONSE, "countries": []}
+            else:
+                jobs.labels("succeeded").inc()
 
-            logger.info(f"{msg.message_id} Response: {result}")
+            logger.info(f"{msg.message_id} Response: {result}", extra=SAMPLED)
             response_msg = ResponseMessage(
                 chat_id=msg.chat_id, user_message_id=msg.message_id, response=result.get("response"), countries=result.get("countries"), title=msg.title, artist=msg.artist
             )
-            await out_exchange.publish(
-                response_msg.prepare(), routing_key=out_queue.name
-            )
+            await reply(response_msg, trace=trace)
+            logger.info(f"{trace.trace_id}\t{msg.message_id} stage timings, ms: {trace.breakdown()}")
+
+    async def on_message(message: AbstractIncomingMessage) -> None:
+        with in_flight_jobs.track_inprogress():
+            try:
+                await process_message(message)
+            except Exception as e:
+                # Redeliver once (e.g. the response could not be published), then drop
+                logger.error(f"Failed to handle message. Error {e}")
+                failures.labels("reply").inc()
+                await message.nack(requeue=not message.redelivered)
+                return
+            # Ack only once the response is published, so unfinished jobs survive a worker crash
+            await message.ack()
 
     return on_message
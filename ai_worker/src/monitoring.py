@@ -0,0 +1,30 @@
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from src.configs import settings
+
+
+# LLM calls take seconds, the default buckets stop at 10s
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 60, 120)
+
+in_flight_jobs = Gauge("ai_worker_in_flight_jobs", "Recognition jobs being processed")
+jobs = Counter("ai_worker_jobs_total", "Processed recognition jobs", ["result"])
+failures = Counter("ai_worker_failures_total", "Failures by pipeline stage", ["stage"])
+queue_wait_seconds = Histogram(
+    "ai_worker_queue_wait_seconds", "Time a job waited in the incoming queue", buckets=LLM_BUCKETS
+)
+lyrics_fetch_seconds = Histogram("ai_worker_lyrics_fetch_seconds", "Lyrics retrieval time", ["source"])
+lyrics_hedged_requests = Counter(
+    "ai_worker_lyrics_hedged_total", "Lyrics requests sent to the next provider before the previous one answered",
+    ["provider"],
+)
+llm_call_seconds = Histogram("ai_worker_llm_call_seconds", "LLM call time", ["stage"], buckets=LLM_BUCKETS)
+llm_first_token_seconds = Histogram(
+    "ai_worker_llm_first_token_seconds", "Time to the first text chunk of a streamed LLM call", ["stage"],
+    buckets=LLM_BUCKETS,
+)
+publish_seconds = Histogram("ai_worker_publish_seconds", "Time to publish a reply and get the broker confirm")
+
+
+def start_metrics_exporter():
+    if settings.worker.metrics_port:
+        start_http_server(settings.worker.metrics_port)
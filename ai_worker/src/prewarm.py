@@ -0,0 +1,136 @@
+"""
+Pre-warm the results cache for a catalog of songs.
+
+Usage: python -m src.prewarm catalog.jsonl [--concurrency 4] [--rate 2]
+
+The catalog is a JSONL file with "artist" and "title" fields on every line or a CSV file with
+"artist" and "title" columns. Songs that already have a result in the collection are skipped,
+so an interrupted run is resumed by starting it again.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+from src.configs import settings
+from src.engine.worker import Engine
+from src.engine.enums import QueryStatus
+from src.repository.mongo_repo import MongodbRepository
+from common_utils.log_util import setup_file_logger
+from common_utils.normalize import song_key
+from common_utils.results import (
+    is_cacheable_response,
+    result_key_query,
+    result_document,
+)
+
+
+logger = setup_file_logger(
+    name="ai_prewarm_logger", log_file="ai_prewarm_logger.log")
+
+
+class RateLimiter:
+    """Spaces out calls so that no more than `rate` of them start per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+            self._next_at = max(now, self._next_at) + self.interval
+
+
+def read_catalog(path: Path) -> Iterator[tuple[str, str]]:
+    with open(path, encoding="utf-8", newline="") as file:
+        if path.suffix.lower() == ".csv":
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for row in rows:
+            artist, title = row.get("artist"), row.get("title")
+            if artist and title:
+                yield artist, title
+            else:
+                logger.error(f"Skipping catalog entry without artist or title: {row}")
+
+
+async def ignore_status(status: QueryStatus):
+    pass
+
+
+async def prewarm(path: Path, concurrency: int, rate: float, chunk_size: int):
+    repository = MongodbRepository(database_url=settings.database.db_url,
+                                   database_name=settings.database.db_name)
+    engine = Engine()
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"skipped": 0, "saved": 0, "failed": 0}
+
+    async def process(artist: str, title: str):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                result = await asyncio.wait_for(
+                    engine.query(artist=artist, title=title, status_callback=ignore_status),
+                    timeout=settings.worker.query_timeout,
+                )
+            except Exception as e:
+                logger.error(f"Failed to process {artist} - {title}. Error {e}")
+                stats["failed"] += 1
+                return
+            response = result.get("response")
+            if not is_cacheable_response(response):
+                logger.info(f"No result for {artist} - {title}: {response}")
+                stats["failed"] += 1
+                return
+            await repository.update_one(
+                collection_name=settings.database.collection_name,
+                query=result_key_query(artist=artist, title=title),
+                update={"$set": result_document(artist=artist, title=title,
+                                                result=response, countries=result.get("countries"))},
+                upsert=True,
+            )
+            stats["saved"] += 1
+
+    songs = read_catalog(path)
+    try:
+        while chunk := list(islice(songs, chunk_size)):
+            unique = {song_key(artist, title): (artist, title) for artist, title in chunk}
+            stats["skipped"] += len(chunk) - len(unique)
+            existing = await repository.find_many(
+                collection_name=settings.database.collection_name,
+                query={"$or": [result_key_query(artist=artist, title=title) for artist, title in unique.values()]},
+                projection={"_id": False, "artist_key": True, "title_key": True},
+            )
+            for document in existing:
+                if unique.pop((document["artist_key"], document["title_key"]), None) is not None:
+                    stats["skipped"] += 1
+            await asyncio.gather(*(process(artist, title) for artist, title in unique.values()))
+            logger.info(f"Pre-warm progress: {stats}")
+    finally:
+        await engine.close()
+    logger.info(f"Pre-warm finished: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute results for a catalog of songs")
+    parser.add_argument("catalog", type=Path, help="JSONL or CSV file with artist and title of songs")
+    parser.add_argument("--concurrency", type=int, default=settings.worker.max_concurrent_queries,
+                        help="Max number of songs processed at once")
+    parser.add_argument("--rate", type=float, default=2, help="Max number of songs started per second, 0 - no limit")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Number of catalog entries checked at once")
+    args = parser.parse_args()
+    asyncio.run(prewarm(args.catalog, args.concurrency, args.rate, args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 from src.configs import settings
 from src.adapter.ws_adapter import WsAdapter
+from common_utils.schemas import set_default_codec
 
 
 if __name__ == "__main__":
+    set_default_codec(settings.rabbit.codec)
     adapter = WsAdapter(
         port=settings.app.port,
         host=settings.app.host,
@@ -1,5 +1,9 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import random
 from pathlib import Path
 
 
@@ -7,8 +11,80 @@ from pathlib import Path
 formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
 logs_dir = Path("/logs")
 
+# LOG_LEVEL - level of the loggers created by setup_file_logger unless it is passed explicitly
+# LOG_MAX_LENGTH - longer messages (e.g. lyrics and LLM outputs) are truncated, 0 disables truncation
+# LOG_SAMPLE_RATE - share of the records logged with extra=SAMPLED that are kept
+log_level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+max_message_length = int(os.getenv("LOG_MAX_LENGTH", "1000"))
+sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+# marks a high-volume line, e.g. logger.info(f"...", extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+
+class SamplingFilter(logging.Filter):
+    """Drops the records marked as sampled, except for the `rate` share of them. Warnings are always kept"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class TruncatingFilter(logging.Filter):
+    """Cuts the message of the record to `max_length` characters"""
+
+    def __init__(self, max_length: int):
+        super().__init__()
+        self.max_length = max_length
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            record.msg = f"{message[:self.max_length]}... [{len(message) - self.max_length} more chars]"
+            record.args = None
+        return True
+
+
+class _RoutingHandler(logging.Handler):
+    """Passes records taken from the queue to the handlers of the logger that created them"""
+
+    def __init__(self):
+        super().__init__()
+        self.routes: dict[str, list[logging.Handler]] = {}
+
+    def emit(self, record: logging.LogRecord):
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_router = _RoutingHandler()
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(formatter)
+_listener: logging.handlers.QueueListener | None = None
+
+
+def _start_listener():
+    """Files and the console are written by one background thread, the callers only put records on a queue"""
+    global _listener
+    if _listener is None:
+        _listener = logging.handlers.QueueListener(_log_queue, _router)
+        _listener.start()
+        # write out the records that are still queued on exit
+        atexit.register(_listener.stop)
+
+
+def setup_file_logger(name: str, log_file: os.PathLike, level: int | None = None):
+    logger = logging.getLogger(name)
+    if name in _router.routes:
+        return logger
 
-def setup_file_logger(name: str, log_file: os.PathLike, level: int = 10):
     log_file_path = logs_dir / log_file
     log_file_path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -17,10 +93,13 @@ def setup_file_logger(name: str, log_file: os.PathLike, level: int = 10):
 
     handler = logging.FileHandler(
         filename=log_file_path, encoding="utf-8", mode="a")
-    console_handler = logging.StreamHandler()
     handler.setFormatter(formatter)
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(handler)
-    logger.addHandler(console_handler)
+    _router.routes[name] = [handler, _console_handler]
+
+    queue_handler = logging.handlers.QueueHandler(_log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(TruncatingFilter(max_message_length))
+    logger.setLevel(level if level is not None else log_level)
+    logger.addHandler(queue_handler)
+    _start_listener()
     return logger
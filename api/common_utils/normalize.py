@@ -0,0 +1,7 @@
+def normalize_text(value: str) -> str:
+    """Casefold and collapse whitespace so that user input variants compare equal"""
+    return " ".join(value.casefold().split())
+
+
+def song_key(artist: str, title: str) -> tuple[str, str]:
+    return normalize_text(artist), normalize_text(title)
@@ -0,0 +1,94 @@
+import asyncio
+from itertools import count
+
+from aio_pika import connect_robust
+from aio_pika.abc import AbstractRobustConnection, AbstractChannel, AbstractMessage
+from aio_pika.exceptions import AMQPConnectionError
+
+from common_utils.log_util import setup_file_logger
+
+
+logger = setup_file_logger(
+    name="rabbit_publisher_logger", log_file="rabbit_publisher_logger.log")
+
+
+async def connect_with_retry(url: str, retries: int = 5, delay: float = 3) -> AbstractRobustConnection:
+    """Connect to RabbitMQ, waiting for the broker to start. The connection recovers by itself afterwards"""
+    for attempt in range(1, retries + 1):
+        try:
+            return await connect_robust(url)
+        except (ConnectionRefusedError, AMQPConnectionError):
+            if attempt == retries:
+                raise
+            logger.info(f"Rabbit not ready, retry #{attempt} in {delay}s...")
+            await asyncio.sleep(delay)
+
+
+class RabbitPublisher:
+    """
+    Publishes messages over a robust (auto-reconnecting) connection using a small pool of channels
+    with publisher confirms. Channels are shared round-robin rather than checked out, so concurrent
+    publishes are pipelined on a channel: every message is still confirmed on its own, but the publishes
+    do not wait for each other's round-trips.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 4,
+        connection: AbstractRobustConnection | None = None,
+        on_return_raises: bool = False,
+    ):
+        """
+        :param on_return_raises: raise aio_pika.exceptions.PublishError when the broker returns
+            a message that could not be routed to any queue
+        """
+        self.url = url
+        self.pool_size = pool_size
+        self.on_return_raises = on_return_raises
+        self.connection = connection
+        self._own_connection = connection is None
+        self._channels: list[AbstractChannel] = []
+        self._counter = count()
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._lock:
+            if self._channels:
+                return
+            if self.connection is None:
+                self.connection = await connect_with_retry(self.url)
+            self._channels = [
+                await self.connection.channel(publisher_confirms=True, on_return_raises=self.on_return_raises)
+                for _ in range(self.pool_size)
+            ]
+
+    async def channel(self) -> AbstractChannel:
+        if not self._channels:
+            await self.connect()
+        return self._channels[next(self._counter) % len(self._channels)]
+
+    async def publish(self, message: AbstractMessage, routing_key: str, exchange_name: str = ""):
+        """Publish the message and wait until the broker confirms it"""
+        channel = await self.channel()
+        if exchange_name:
+            exchange = await channel.get_exchange(exchange_name, ensure=False)
+        else:
+            exchange = channel.default_exchange
+        await exchange.publish(message, routing_key=routing_key)
+
+    async def declare_queue(self, name: str, **kwargs):
+        channel = await self.channel()
+        return await channel.declare_queue(name, **kwargs)
+
+    async def declare_exchange(self, name: str, **kwargs):
+        channel = await self.channel()
+        return await channel.declare_exchange(name, **kwargs)
+
+    async def close(self):
+        for channel in self._channels:
+            await channel.close()
+        self._channels = []
+        if self._own_connection and self.connection is not None:
+            await self.connection.close()
+            self.connection = None
@@ -0,0 +1,21 @@
+from common_utils.normalize import song_key
+
+
+# Responses that must not be stored as results of the song
+FAILED_RESPONSE = "Something went wrong. Try again later"
+NO_LYRICS_RESPONSE = "Could not retrieve track lyrics. Try again later"
+
+
+def is_cacheable_response(response: str) -> bool:
+    return FAILED_RESPONSE not in response
+
+
+def result_key_query(artist: str, title: str) -> dict:
+    """Query matching the result document of the song by its normalized key fields"""
+    artist_key, title_key = song_key(artist, title)
+    return {"artist_key": artist_key, "title_key": title_key}
+
+
+def result_document(artist: str, title: str, result: str, countries: list) -> dict:
+    return {**result_key_query(artist, title), "artist": artist, "title": title,
+            "result": result, "countries": countries}
@@ -1,15 +1,20 @@
-import json
 import uuid
+from abc import ABC, abstractmethod
 from enum import Enum
-from pydantic import BaseModel, Field
-from typing import TypeGuard, Optional
+
+import msgpack
+from pydantic import BaseModel, Field, TypeAdapter, Discriminator, Tag
+from typing import Any, TypeGuard, Optional, Annotated, Union
 from aio_pika import Message as RabbitMessage
+from aio_pika.abc import AbstractMessage
 
 
 class MessageType(Enum):
     USER_MESSAGE = "user_message"
     STATUS_MESSAGE = "status_message"
     RESPONSE_MESSAGE = "response_message"
+    CANCEL_MESSAGE = "cancel_message"
+    PARTIAL_MESSAGE = "partial_message"
 
 
 class WsAuthRequest(BaseModel):
@@ -24,16 +29,17 @@ class Message(BaseModel):
     chat_id: str
     type: MessageType
 
-    def prepare(self):
-        return RabbitMessage(self.model_dump_json().encode("utf-8"))
+    def prepare(self, codec: Optional["MessageCodec"] = None, **properties):
+        """
+        :param codec: codec of the message body, the default codec is used if not set
+        :param properties: AMQP message properties, e.g. reply_to and correlation_id
+        """
+        codec = codec or default_codec
+        return RabbitMessage(codec.encode(self), content_type=codec.content_type, **properties)
 
     @classmethod
-    def from_rabbit_message(cls, message: RabbitMessage) -> "Message":
-        message_str = message.body.decode("utf-8")
-        message_dict = json.loads(message_str)
-        message_type = Message(**message_dict).type
-
-        return MESSAGE_TYPE_TO_CLASS[message_type](**message_dict)
+    def from_rabbit_message(cls, message: AbstractMessage) -> "Message":
+        return get_codec(message.content_type).decode(message.body)
 
     def is_user_message(self) -> TypeGuard["UserMessage"]:
         return self.type == MessageType.USER_MESSAGE
@@ -44,6 +50,12 @@ class Message(BaseModel):
     def is_response_message(self) -> TypeGuard["ResponseMessage"]:
         return self.type == MessageType.RESPONSE_MESSAGE
 
+    def is_cancel_message(self) -> TypeGuard["CancelMessage"]:
+        return self.type == MessageType.CANCEL_MESSAGE
+
+    def is_partial_message(self) -> TypeGuard["PartialMessage"]:
+        return self.type == MessageType.PARTIAL_MESSAGE
+
 
 class UserMessage(Message):
     type: MessageType = MessageType.USER_MESSAGE
@@ -67,11 +79,87 @@ class ResponseMessage(Message):
     artist: str
 
 
+class PartialMessage(Message):
+    """Text of the response generated so far, sent while the LLM is streaming it"""
+    type: MessageType = MessageType.PARTIAL_MESSAGE
+    user_message_id: str
+    text: str
 
 
+class CancelMessage(Message):
+    """Requests of the chat that nobody waits for anymore"""
+    type: MessageType = MessageType.CANCEL_MESSAGE
+    message_ids: list[str]
+
 
 MESSAGE_TYPE_TO_CLASS = {
     MessageType.USER_MESSAGE: UserMessage,
     MessageType.STATUS_MESSAGE: StatusMessage,
-    MessageType.RESPONSE_MESSAGE: ResponseMessage
-}
\ No newline at end of file
+    MessageType.RESPONSE_MESSAGE: ResponseMessage,
+    MessageType.CANCEL_MESSAGE: CancelMessage,
+    MessageType.PARTIAL_MESSAGE: PartialMessage,
+}
+
+def _message_type(value: Any) -> str:
+    message_type = value.get("type") if isinstance(value, dict) else getattr(value, "type", None)
+    return MessageType(message_type).value
+
+
+# Parses any message in one pass, picking the class by the "type" field
+AnyMessage = Annotated[
+    Union[tuple(Annotated[message_class, Tag(message_type.value)]
+                for message_type, message_class in MESSAGE_TYPE_TO_CLASS.items())],
+    Discriminator(_message_type),
+]
+MESSAGE_ADAPTER: TypeAdapter[AnyMessage] = TypeAdapter(AnyMessage)
+
+
+class MessageCodec(ABC):
+    """Serialization of broker messages, selected by the AMQP content-type header"""
+    name: str
+    content_type: str
+
+    @abstractmethod
+    def encode(self, message: Message) -> bytes: ...
+
+    @abstractmethod
+    def decode(self, body: bytes) -> Message: ...
+
+
+class JsonCodec(MessageCodec):
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, message: Message) -> bytes:
+        return message.model_dump_json().encode("utf-8")
+
+    def decode(self, body: bytes) -> Message:
+        return MESSAGE_ADAPTER.validate_json(body)
+
+
+class MsgpackCodec(MessageCodec):
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def encode(self, message: Message) -> bytes:
+        return msgpack.packb(message.model_dump(mode="json"))
+
+    def decode(self, body: bytes) -> Message:
+        return MESSAGE_ADAPTER.validate_python(msgpack.unpackb(body))
+
+
+CODECS: dict[str, MessageCodec] = {codec.name: codec for codec in (JsonCodec(), MsgpackCodec())}
+CONTENT_TYPE_TO_CODEC: dict[str, MessageCodec] = {codec.content_type: codec for codec in CODECS.values()}
+
+default_codec: MessageCodec = CODECS["json"]
+
+
+def set_default_codec(name: str):
+    """Select the codec used for outgoing messages. Incoming messages are decoded by their content type"""
+    global default_codec
+    default_codec = CODECS[name]
+
+
+def get_codec(content_type: str | None) -> MessageCodec:
+    # messages without content type come from producers that only speak JSON
+    return CONTENT_TYPE_TO_CODEC.get(content_type, CODECS["json"])
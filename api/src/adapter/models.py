@@ -5,6 +5,17 @@ from datetime import datetime as dt, timezone
 from pydantic import BaseModel, Field
 from enum import Enum
 from common_utils.schemas import Message
+from src.configs import settings
+
+
+class RecognizeTrack(BaseModel):
+    id: str
+    artist: str
+    title: str
+
+
+class RecognizeTracksRequest(BaseModel):
+    tracks: list[RecognizeTrack] = Field(min_length=1, max_length=settings.app.max_batch_size)
 
 
 class WsOutMessageType(Enum):
@@ -25,6 +36,7 @@ class WsOutResponse(WsOutMessage):
 class WsEventType(Enum):
     STATUS_MESSAGE = "statusMessage"
     NEW_MESSAGE = "newMessage"
+    PARTIAL_MESSAGE = "partialMessage"
 
 
 
@@ -53,6 +65,13 @@ class WsOutEvent(WsOutMessage):
                     text=message.text,
                 )
             )
+        if message.is_partial_message():
+            return WsPartialEvent(
+                data=StatusMessageData(
+                    user_message_id=message.user_message_id,
+                    text=message.text,
+                )
+            )
 
 
 class StatusMessageData(BaseModel):
@@ -65,6 +84,11 @@ class WsStatusEvent(WsOutEvent):
     data: StatusMessageData
 
 
+class WsPartialEvent(WsOutEvent):
+    event: WsEventType = WsEventType.PARTIAL_MESSAGE
+    data: StatusMessageData
+
+
 
 class MessageData(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -74,6 +98,7 @@ class MessageData(BaseModel):
     countries: Optional[list] = None
     title: str
     artist: str
+    timings: Optional[dict] = None
 
 
 class WsNewMessageEvent(WsOutEvent):
@@ -1,23 +1,34 @@
 import json
+import time
 import asyncio
+from datetime import datetime, timezone
 import uvicorn
-from fastapi import Depends
+from fastapi import Depends, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from fastapi.middleware.cors import CORSMiddleware
-from aio_pika import connect
+from aio_pika import ExchangeType
 from aio_pika.abc import AbstractIncomingMessage
-from aio_pika.exceptions import AMQPConnectionError
 from typing import Optional, Iterable
 from pydantic import ValidationError
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
 from src.utils.ws_fast_api import BotFastAPI
 from src.utils.token import verify_token
+from src.utils.inflight import InFlightRegistry, Waiter
+from src.utils.fuzzy import TrigramIndex, FuzzyMatch
+from src.utils.ws_connection import WsConnection
+from src.utils import metrics
 from src.exceptions.exceptions import MethodNotAllowedError, InternalError, JsonDecodeError, MissingDataError
-from src.repository.mongo_repo import MongodbRepository
+from src.repository.mongo_repo import MongodbRepository, ASCENDING
+from src.repository.memory_cache import TTLCache, MISSING, NEGATIVE
 from src.configs import settings
-from src.adapter.models import WsOutEvent, WsNewMessageEvent, MessageData
-from common_utils.log_util import setup_file_logger
-from common_utils.schemas import UserMessage, StatusMessage, WsAuthRequest, Message, WsAuthResponse
+from src.adapter.models import WsOutEvent, WsNewMessageEvent, MessageData, RecognizeTrack, RecognizeTracksRequest
+from common_utils.log_util import setup_file_logger, SAMPLED
+from common_utils.publisher import RabbitPublisher, connect_with_retry
+from common_utils.schemas import UserMessage, StatusMessage, CancelMessage, WsAuthRequest, Message, WsAuthResponse
+from common_utils.normalize import song_key
+from common_utils.tracing import TraceContext
+from common_utils.results import FAILED_RESPONSE, NO_LYRICS_RESPONSE, is_cacheable_response, result_key_query, result_document
 
 logger = setup_file_logger(
     name="ws_adapter_logger", log_file="ws_adapter_looger.log")
@@ -42,22 +53,32 @@ class WsAdapter:
         self.port = port
         self.app = BotFastAPI()
         self.methods = {
-            "recognizeSong": self._recognize_song
+            "recognizeSong": self._recognize_song,
+            "recognizeSongs": self._recognize_songs,
         }
         self.rabbit_mq_url = rabbit_mq_url
-        self.rabbit_outgoing_connection = None
+        self.publisher = RabbitPublisher(rabbit_mq_url, pool_size=settings.rabbit.publisher_pool_size)
         self.rabbit_incoming_connection = None
-        self.rabbit_outgoing_channel = None
-        self.exchange = None
+        self.rabbit_outgoing_lock = asyncio.Lock()
         self.outgoing_queue = None
+        self.cancel_exchange = None
         self.queue_prefix = queue_prefix
+        self.reply_queue_name = f"outgoing_{queue_prefix}.{settings.app.instance_id}"
         self.chat_data: dict[int, WsAuthRequest] = {}
+        self.in_flight = InFlightRegistry(ttl=settings.app.inflight_ttl)
+        metrics.in_flight_requests.set_function(lambda: len(self.in_flight))
+        self.background_tasks: set[asyncio.Task] = set()
+        self.cache = TTLCache(max_size=settings.cache.max_size,
+                              ttl=settings.cache.ttl,
+                              negative_ttl=settings.cache.negative_ttl)
+        self.fuzzy_index = TrigramIndex(max_candidates=settings.cache.fuzzy_max_candidates)
+        self.fuzzy_last_id = None
 
 
     async def _handle_messages(
-        self, websocket: WebSocket, chat_id: int, client_data: dict
+        self, websocket: WsConnection, chat_id: int, client_data: dict
     ):
-        logger.info(f"method in request is: {client_data.get("method")}")
+        logger.info(f"method in request is: {client_data.get("method")}", extra=SAMPLED)
         method = self.methods.get(client_data.get("method"))
         if method is not None:
             try:
@@ -86,99 +107,371 @@ class WsAdapter:
             )
 
     async def _recognize_song(self, chat_id: str, client_data: dict, websocket):
-        artist = client_data["artist"]
-        title = client_data["title"]
-        message_id = client_data["id"]
-        logger.info(f"received title: {title}. received artist: {artist}")
-        cache, countries = await self._find_result_in_cache(artist=artist, title=title)
+        received_at = time.time()
+        track = RecognizeTrack(id=client_data["id"], artist=client_data["artist"], title=client_data["title"])
+        logger.info(f"received title: {track.title}. received artist: {track.artist}")
+        cache, countries = await self._find_result_in_cache(artist=track.artist, title=track.title)
         if cache:
-            data = WsNewMessageEvent(
-                data=MessageData(
-                    user_message_id=message_id,
-                    text=cache,
-                    countries=countries,
-                    title=title,
-                    artist=artist,
-                )
-            )
-            await websocket.send_text(data.model_dump_json())
+            await self._send_cached_result(websocket, track, cache, countries)
         else:
-            data = UserMessage(
-                chat_id=chat_id,
-                message_id=message_id,
-                artist=artist,
-                title=title
+            await self._request_recognition(chat_id, [track], received_at=received_at)
+
+    async def _recognize_songs(self, chat_id: str, client_data: dict, websocket):
+        received_at = time.time()
+        tracks = RecognizeTracksRequest(tracks=client_data["tracks"]).tracks
+        logger.info(f"received {len(tracks)} tracks for recognition")
+        cached = await self._find_results_in_cache(tracks)
+        misses = []
+        for track in tracks:
+            result = cached.get(song_key(track.artist, track.title))
+            if result is not None and result[0]:
+                await self._send_cached_result(websocket, track, *result)
+            else:
+                misses.append(track)
+        if misses:
+            await self._request_recognition(chat_id, misses, received_at=received_at)
+
+    async def _send_cached_result(self, websocket, track: RecognizeTrack, result: str, countries: list):
+        data = WsNewMessageEvent(
+            data=MessageData(
+                user_message_id=track.id,
+                text=result,
+                countries=countries,
+                title=track.title,
+                artist=track.artist,
             )
-            await self._recognize_song_request(data)
+        )
+        await websocket.send_text(data.model_dump_json())
 
-    async def _recognize_song_request(self, data: UserMessage):
-        await self.send_to_rabbitmq(data)
+    async def _request_recognition(self, chat_id: str, tracks: list[RecognizeTrack], received_at: float | None = None):
+        """Publish recognition requests for the tracks that are not already in flight"""
+        messages = []
+        for track in tracks:
+            key = song_key(track.artist, track.title)
+            if self.in_flight.join(key, chat_id=chat_id, message_id=track.id, artist=track.artist, title=track.title):
+                self.cache.set_negative(key)
+                messages.append(UserMessage(
+                    chat_id=chat_id,
+                    message_id=track.id,
+                    artist=track.artist,
+                    title=track.title
+                ))
+            else:
+                logger.info(f"{chat_id}\t{track.id} attached to in-flight request for {track.artist} - {track.title}")
+        if not messages:
+            return
 
+        results = await asyncio.gather(
+            *(self._recognize_song_request(message, TraceContext().stamp("api_received", received_at))
+              for message in messages),
+            return_exceptions=True
+        )
+        error = None
+        for message, result in zip(messages, results):
+            if isinstance(result, Exception):
+                metrics.failures.labels("publish").inc()
+                # requests that attached while the publish was in progress would wait forever otherwise
+                waiters = self.in_flight.resolve(chat_id, message.message_id)
+                self.cache.invalidate(song_key(message.artist, message.title))
+                await self._send_failure(waiters, artist=message.artist, title=message.title)
+                error = result
+        if error is not None:
+            raise error
+
+    async def _send_failure(self, waiters: list[Waiter], artist: str, title: str):
+        """Answer the waiters of a request that will not get a response from the worker"""
+        for waiter in waiters:
+            payload = WsNewMessageEvent(
+                data=MessageData(user_message_id=waiter.message_id, text=FAILED_RESPONSE, countries=[],
+                                 title=title, artist=artist)
+            ).model_dump_json()
+            for connection in self.app.opened_ws.get(waiter.chat_id, []):
+                await connection.send_text(payload)
+
+    async def _recognize_song_request(self, data: UserMessage, trace: TraceContext | None = None):
+        await self.send_to_rabbitmq(data, trace=trace)
+
+
+    async def _ensure_cache_indexes(self):
+        await self.client.create_index(
+            collection_name=settings.database.collection_name,
+            keys=[("artist_key", ASCENDING), ("title_key", ASCENDING)],
+            name="song_key_unique",
+            unique=True,
+            # documents created before the keys were introduced have no key fields
+            partialFilterExpression={"artist_key": {"$exists": True}, "title_key": {"$exists": True}},
+        )
 
     async def _find_result_in_cache(self, artist: str, title: str):
-        result: dict = await self.client.find_one(collection_name=settings.database.collection_name,
-                                    query={"artist": artist, "title": title})
+        cached = self.cache.get(song_key(artist, title))
+        if cached is NEGATIVE:
+            metrics.cache_requests.labels("negative").inc()
+            return None, None
+        if cached is not MISSING:
+            metrics.cache_requests.labels("memory_hit").inc()
+            return cached
+        with metrics.cache_lookup_seconds.time():
+            result: dict = await self.client.find_one(collection_name=settings.database.collection_name,
+                                        query=result_key_query(artist=artist, title=title))
         if result:
-            return result.get('result', None), result.get('countries', [])
+            metrics.cache_requests.labels("hit").inc()
+            cached = result.get('result', None), result.get('countries', [])
+            self.cache.set(song_key(artist, title), cached)
+            return cached
+        if settings.cache.fuzzy_enabled:
+            match = self._search_fuzzy_index(artist, title)
+            if match is not None and match.key != song_key(artist, title):
+                cached = await self._find_results_by_keys([match.key])
+                if match.key in cached:
+                    logger.info(f"{artist} - {title} matched cached {match.key} with score {match.score:.2f}")
+                    metrics.cache_requests.labels("fuzzy_hit").inc()
+                    self.cache.set(song_key(artist, title), cached[match.key])
+                    return cached[match.key]
+        metrics.cache_requests.labels("miss").inc()
         return None, None
 
-    async def _save_result_to_cache(self, artist: str, title: str, countries: list, result: str):
-        result: dict = await self.client.insert_one(collection_name=settings.database.collection_name,
-                                    query={"artist": artist, "title": title, "result": result, "countries": countries})
+    async def _find_results_in_cache(self, tracks: list[RecognizeTrack]) -> dict[tuple[str, str], tuple]:
+        """Resolve cached results for many tracks with at most one database query"""
+        found = {}
+        lookup = {}
+        for track in tracks:
+            key = song_key(track.artist, track.title)
+            cached = self.cache.get(key)
+            if cached is NEGATIVE:
+                metrics.cache_requests.labels("negative").inc()
+                continue
+            if cached is not MISSING:
+                metrics.cache_requests.labels("memory_hit").inc()
+                found[key] = cached
+            else:
+                lookup[key] = result_key_query(artist=track.artist, title=track.title)
+        if lookup:
+            with metrics.cache_lookup_seconds.time():
+                documents = await self.client.find_many(collection_name=settings.database.collection_name,
+                                                        query={"$or": list(lookup.values())})
+            for document in documents:
+                key = document["artist_key"], document["title_key"]
+                found[key] = document.get('result', None), document.get('countries', [])
+                self.cache.set(key, found[key])
+            metrics.cache_requests.labels("hit").inc(len(documents))
+            misses = len(lookup) - len(documents)
+            if settings.cache.fuzzy_enabled and misses:
+                missed = lookup.keys() - found.keys()
+                fuzzy_found = await self._find_fuzzy_results(
+                    [track for track in tracks if song_key(track.artist, track.title) in missed]
+                )
+                found.update(fuzzy_found)
+                misses -= len(fuzzy_found)
+            metrics.cache_requests.labels("miss").inc(misses)
+        return found
 
+    def _search_fuzzy_index(self, artist: str, title: str) -> FuzzyMatch | None:
+        return self.fuzzy_index.search(artist, title, title_threshold=settings.cache.fuzzy_title_threshold,
+                                       artist_threshold=settings.cache.fuzzy_artist_threshold)
 
-    async def send_to_rabbitmq(self, message: UserMessage):
-        if not self.rabbit_outgoing_connection:
-            self.rabbit_outgoing_connection = await self.connect_with_retry(self.rabbit_mq_url)
-        if not self.rabbit_outgoing_channel:
-            self.rabbit_outgoing_channel = (
-                await self.rabbit_outgoing_connection.channel()
-            )
+    async def _find_fuzzy_results(self, tracks: list[RecognizeTrack]) -> dict[tuple[str, str], tuple]:
+        """Resolve the tracks to the cached results of the closest known spellings of the songs"""
+        matches = {}
+        for track in tracks:
+            match = self._search_fuzzy_index(track.artist, track.title)
+            key = song_key(track.artist, track.title)
+            if match is not None and match.key != key:
+                matches[key] = match.key
+        if not matches:
+            return {}
+        cached = await self._find_results_by_keys(list(set(matches.values())))
+        found = {}
+        for key, match_key in matches.items():
+            if match_key in cached:
+                found[key] = cached[match_key]
+                self.cache.set(key, found[key])
+        metrics.cache_requests.labels("fuzzy_hit").inc(len(found))
+        return found
 
-        if not self.exchange:
-            self.exchange = self.rabbit_outgoing_channel.default_exchange
-        if not self.outgoing_queue:
-            self.outgoing_queue = await self.rabbit_outgoing_channel.declare_queue(
-                f"incoming_{self.queue_prefix}", durable=True
-            )
+    async def _find_results_by_keys(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], tuple]:
+        """Results of already normalized song keys from memory, the rest with one database query"""
+        found = {}
+        for key in keys:
+            cached = self.cache.get(key)
+            if cached is not MISSING and cached is not NEGATIVE:
+                found[key] = cached
+        lookup = [{"artist_key": key[0], "title_key": key[1]} for key in keys if key not in found]
+        if lookup:
+            with metrics.cache_lookup_seconds.time():
+                documents = await self.client.find_many(collection_name=settings.database.collection_name,
+                                                        query={"$or": lookup})
+            for document in documents:
+                key = document["artist_key"], document["title_key"]
+                found[key] = document.get('result', None), document.get('countries', [])
+                self.cache.set(key, found[key])
+        return found
+
+    async def _refresh_fuzzy_index(self):
+        """
+        Index the results added to the database since the last refresh (by any API instance).
+        They are loaded in batches in the order of _id, giving the event loop a turn between batches
+        """
+        added = 0
+        while True:
+            query = {"artist_key": {"$exists": True}, "result": {"$ne": NO_LYRICS_RESPONSE}}
+            if self.fuzzy_last_id is not None:
+                query["_id"] = {"$gt": self.fuzzy_last_id}
+            documents = await self.client.find_many(collection_name=settings.database.collection_name, query=query,
+                                                    projection={"artist": True, "title": True,
+                                                                "artist_key": True, "title_key": True},
+                                                    sort=[("_id", ASCENDING)], limit=settings.cache.fuzzy_batch_size)
+            for document in documents:
+                self.fuzzy_index.add((document["artist_key"], document["title_key"]),
+                                     artist=document["artist"], title=document["title"])
+            if documents:
+                self.fuzzy_last_id = documents[-1]["_id"]
+            added += len(documents)
+            if len(documents) < settings.cache.fuzzy_batch_size:
+                return added
+            await asyncio.sleep(0)
+
+    async def _keep_fuzzy_index_fresh(self):
+        while True:
+            try:
+                added = await self._refresh_fuzzy_index()
+                if added:
+                    logger.info(f"Fuzzy index: {added} songs added, {len(self.fuzzy_index)} in total")
+            except Exception as exc:
+                logger.error(f"Failed to refresh the fuzzy index: {exc}")
+            await asyncio.sleep(settings.cache.fuzzy_refresh_interval)
 
-        await self.exchange.publish(
-            message.prepare(),
-            routing_key=self.outgoing_queue.name,
+    def _save_result_to_cache(self, artist: str, title: str, countries: list, result: str):
+        """Update the in-process cache right away and write the result to the database in the background"""
+        self.cache.set(song_key(artist, title), (result, countries))
+        if settings.cache.fuzzy_enabled and result != NO_LYRICS_RESPONSE:
+            self.fuzzy_index.add(song_key(artist, title), artist=artist, title=title)
+        task = asyncio.create_task(
+            self._persist_result(artist=artist, title=title, countries=countries, result=result)
         )
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def _persist_result(self, artist: str, title: str, countries: list, result: str):
+        try:
+            await self.client.update_one(collection_name=settings.database.collection_name,
+                                         query=result_key_query(artist=artist, title=title),
+                                         update={"$set": result_document(artist=artist, title=title,
+                                                                         result=result, countries=countries)},
+                                         upsert=True)
+        except Exception as exc:
+            logger.error(f"Failed to save result for {artist} - {title}: {exc}")
+            metrics.failures.labels("persist").inc()
+
+    async def send_to_rabbitmq(self, message: UserMessage, trace: TraceContext | None = None):
+        async with self.rabbit_outgoing_lock:
+            if self.outgoing_queue is None:
+                await self.publisher.connect()
+                self.outgoing_queue = await self.publisher.declare_queue(
+                    f"incoming_{self.queue_prefix}", durable=True
+                )
+                self.cancel_exchange = await self.publisher.declare_exchange(
+                    f"cancel_{self.queue_prefix}", type=ExchangeType.FANOUT, durable=True
+                )
+
+        trace = (trace or TraceContext()).stamp("api_published")
+        with metrics.publish_seconds.time():
+            await self.publisher.publish(
+                message.prepare(reply_to=self.reply_queue_name, correlation_id=message.message_id,
+                                expiration=settings.app.job_ttl, timestamp=datetime.now(tz=timezone.utc),
+                                headers=trace.to_headers()),
+                routing_key=self.outgoing_queue.name,
+            )
 
-    async def connect_with_retry(self, url, retries=5, delay=3):
-        for attempt in range(1, retries + 1):
+    async def _expire_in_flight_requests(self):
+        """
+        Jobs expired by the broker (job_ttl) or lost by a worker never get a response:
+        their waiters get an error once the in-flight entry expires
+        """
+        while True:
+            await asyncio.sleep(settings.app.inflight_check_interval)
             try:
-                return await connect(url)
-            except (ConnectionRefusedError, AMQPConnectionError) as e:
-                if attempt == retries:
-                    raise
-                logger.info(f"Rabbit not ready, retry #{attempt} in {delay}s...")
-                await asyncio.sleep(delay)
+                for key, entry in self.in_flight.expire():
+                    logger.error(f"{entry.leader.chat_id}\t{entry.leader.message_id} got no response in "
+                                 f"{self.in_flight.ttl}s, failing {len(entry.waiters)} waiters")
+                    metrics.failures.labels("inflight_expired").inc()
+                    self.cache.invalidate(key)
+                    await self._send_failure(entry.waiters, artist=entry.artist, title=entry.title)
+            except Exception as exc:
+                logger.error(f"Failed to expire in-flight requests: {exc}")
+
+    async def _cancel_abandoned_jobs(self, chat_id: str):
+        """Tell the workers to skip requests that nobody waits for after the chat has disconnected"""
+        leaders: dict[str, list[str]] = {}
+        for key, leader in self.in_flight.abandon(chat_id):
+            self.cache.invalidate(key)
+            leaders.setdefault(leader.chat_id, []).append(leader.message_id)
+        if not leaders or self.cancel_exchange is None:
+            return
+        for leader_chat_id, message_ids in leaders.items():
+            logger.info(f"{chat_id}\tCancelling abandoned requests {message_ids}")
+            await self.publisher.publish(
+                CancelMessage(chat_id=leader_chat_id, message_ids=message_ids).prepare(),
+                routing_key="",
+                exchange_name=self.cancel_exchange.name,
+            )
 
     async def listen_for_rabbitmq_responses(self):
         if not self.rabbit_incoming_connection:
             logger.info("Establishing a connection with RabbitMQ ....")
-            self.rabbit_incoming_connection = await self.connect_with_retry(self.rabbit_mq_url)
+            self.rabbit_incoming_connection = await connect_with_retry(self.rabbit_mq_url)
             logger.info(f"Connection is ready")
         channel = await self.rabbit_incoming_connection.channel()
+        # Replies to the requests published by this instance
+        reply_queue = await channel.declare_queue(self.reply_queue_name, exclusive=True, auto_delete=True)
+        # Replies whose instance has died are broadcast to every instance
+        broadcast_exchange = await channel.declare_exchange(
+            f"broadcast_{self.queue_prefix}", ExchangeType.FANOUT, durable=True
+        )
+        await reply_queue.bind(broadcast_exchange)
+        await reply_queue.consume(self.handle_rabbit_message, no_ack=True)
+        # Shared queue, used for requests published without reply_to
         queue = await channel.declare_queue(f"outgoing_{self.queue_prefix}")
         await queue.consume(self.handle_rabbit_message, no_ack=True)
         await asyncio.Future()
 
     async def handle_rabbit_message(self, message: AbstractIncomingMessage):
         msg = Message.from_rabbit_message(message)
-        logger.info(f'Message for worker - {msg}')
-        out_event = WsOutEvent.from_message(msg)
-        for websocket in self.app.opened_ws.get(msg.chat_id, []):
-            data: WsNewMessageEvent = out_event
-            if data.event == 'newMessage' and "Something went wrong. Try again later" not in data.data.text:
-                await self._save_result_to_cache(artist=data.data.artist,
-                                                 title=data.data.title,
-                                                 countries=data.data.countries,
-                                                 result=data.data.text)
-            await websocket.send_text(out_event.model_dump_json())
+        logger.info(f'Message for worker - {msg}', extra=SAMPLED)
+        trace = TraceContext.from_headers(message.headers) if msg.is_response_message() else None
+        if trace is not None:
+            trace.stamp("api_reply_received")
+        if msg.is_response_message():
+            waiters = self.in_flight.resolve(msg.chat_id, msg.user_message_id)
+            if is_cacheable_response(msg.response):
+                self._save_result_to_cache(artist=msg.artist,
+                                           title=msg.title,
+                                           countries=msg.countries,
+                                           result=msg.response)
+            else:
+                # let the next request for the song try again instead of waiting for the negative entry to expire
+                self.cache.invalidate(song_key(msg.artist, msg.title))
+        else:
+            waiters = self.in_flight.waiters(msg.chat_id, msg.user_message_id)
+        if not waiters:
+            waiters = [Waiter(chat_id=msg.chat_id, message_id=msg.user_message_id)]
+
+        # status updates and partial texts of the same request replace each other in a congested outbound queue
+        coalesce_key = None if msg.is_response_message() else msg.type
+        for waiter in waiters:
+            out_event = WsOutEvent.from_message(
+                msg.model_copy(update={"chat_id": waiter.chat_id, "user_message_id": waiter.message_id})
+            )
+            if trace is not None and settings.app.expose_timings:
+                out_event.data.timings = trace.breakdown()
+            payload = out_event.model_dump_json()
+            for connection in self.app.opened_ws.get(waiter.chat_id, []):
+                await connection.send_text(
+                    payload, coalesce_key=coalesce_key and (coalesce_key, waiter.message_id)
+                )
+
+        if trace is not None:
+            trace.stamp("delivered")
+            logger.info(f"{trace.trace_id}\t{msg.chat_id}\t{msg.user_message_id} stage timings, ms: {trace.breakdown()}")
 
     def build_app(self):
         self.app.add_middleware(
@@ -193,7 +486,14 @@ class WsAdapter:
             """
             Check for status
             """
-            return {"status": "ok"}
+            return {"status": "ok", "cache": self.cache.stats()}
+
+        @self.app.get("/metrics")
+        async def prometheus_metrics():
+            """
+            Metrics in the prometheus text format
+            """
+            return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
         @self.app.post(
             "/ws_auth", response_model=WsAuthResponse, response_model_exclude_unset=True
@@ -222,7 +522,13 @@ class WsAdapter:
             verify_token(header_token=authorization)
 
             await websocket.accept()
-            self.app.opened_ws[chat_id].append(websocket)
+            connection = WsConnection(websocket, chat_id=chat_id,
+                                      max_queue=settings.app.ws_queue_size,
+                                      high_water=settings.app.ws_high_water,
+                                      send_timeout=settings.app.send_timeout)
+            connection.start()
+            self.app.opened_ws[chat_id].append(connection)
+            metrics.open_websockets.inc()
             try:
                 while True:
                     message = await websocket.receive()
@@ -231,31 +537,56 @@ class WsAdapter:
                     try:
                         client_data = json.loads(message.get("text"))
                         task = asyncio.create_task(
-                            self._handle_messages(websocket, chat_id, client_data)
+                            self._handle_messages(connection, chat_id, client_data)
                         )
                         self.app.tasks[chat_id][id(task)] = task
+                        task.add_done_callback(lambda t: self.app.tasks.get(chat_id, {}).pop(id(t), None))
 
                     except (json.JSONDecodeError, UnicodeDecodeError) as e:
                         data = message.get("bytes")
                         if data is None:
                             logger.error('Json decode error')
-                            await websocket.send_json(JsonDecodeError().to_json())
+                            await connection.send_json(JsonDecodeError().to_json())
                     except Exception as e:
                         logger.error(e)
             except WebSocketDisconnect:
-                if websocket in self.app.opened_ws[chat_id]:
-                    self.app.opened_ws[chat_id].remove(websocket)
                 logger.info(
                     f"{chat_id}\tWebSocket {chat_id} closed by client. "
-                    f'{len(self.app.opened_ws["user_id"])} left'
+                    f'{len(self.app.opened_ws[chat_id]) - 1} left'
                 )
             except asyncio.CancelledError:
                 logger.info(f"{chat_id}\tTask cancelled")
             finally:
+                metrics.open_websockets.dec()
+                if connection in self.app.opened_ws[chat_id]:
+                    self.app.opened_ws[chat_id].remove(connection)
+                if not self.app.opened_ws[chat_id]:
+                    del self.app.opened_ws[chat_id]
+                    if settings.app.cancel_abandoned_jobs:
+                        try:
+                            await self._cancel_abandoned_jobs(chat_id)
+                        except Exception as exc:
+                            logger.error(f"{chat_id}\tFailed to cancel abandoned requests: {exc}")
+                await connection.close()
                 for task in self.app.tasks[chat_id].values():
                     task.cancel()
                 del self.app.tasks[chat_id]
 
+        @self.app.on_event("startup")
+        async def ensure_cache_indexes():
+            await self._ensure_cache_indexes()
+
+        @self.app.on_event("startup")
+        def start_fuzzy_index():
+            if settings.cache.fuzzy_enabled:
+                task = asyncio.create_task(self._keep_fuzzy_index_fresh())
+                self.background_tasks.add(task)
+
+        @self.app.on_event("startup")
+        def start_in_flight_expiry():
+            task = asyncio.create_task(self._expire_in_flight_requests())
+            self.background_tasks.add(task)
+
         @self.app.on_event("startup")
         def start_rabbitmq_listener():
             loop = asyncio.get_event_loop()
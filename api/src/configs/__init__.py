@@ -4,12 +4,14 @@ from src.configs.base import BaseApplicationSettings
 from src.configs.database import MongoSettings
 from src.configs.application import AppSettings
 from src.configs.rabbit import RabbitSettings
+from src.configs.cache import CacheSettings
 
 
 class ApplicationSettings(BaseApplicationSettings):
     app: ClassVar[AppSettings] = AppSettings()
     database: ClassVar[MongoSettings] = MongoSettings()
     rabbit: ClassVar[RabbitSettings] = RabbitSettings()
+    cache: ClassVar[CacheSettings] = CacheSettings()
 
 
 settings = ApplicationSettings()
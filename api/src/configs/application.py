@@ -1,3 +1,6 @@
+import uuid
+
+from pydantic import Field
 from pydantic_settings import SettingsConfigDict
 
 from src.configs.base import BaseApplicationSettings
@@ -7,4 +10,21 @@ class AppSettings(BaseApplicationSettings):
     host: str = "0.0.0.0"
     port: int
     token: str
+    # seconds a published request waits for its response before its waiters get an error. Must cover
+    # job_ttl plus the worker's WORKER_QUERY_TIMEOUT (200), otherwise a valid job can be published twice
+    inflight_ttl: float = 420
+    # seconds between the checks for expired in-flight requests
+    inflight_check_interval: float = 10
+    max_batch_size: int = 500
+    send_timeout: float = 5
+    ws_queue_size: int = 64
+    ws_high_water: int = 256
+    # seconds a recognition request may wait in the queue before the broker drops it
+    job_ttl: float = 200
+    # ask the worker to skip requests whose chats have disconnected
+    cancel_abandoned_jobs: bool = True
+    # add per-stage timings of the request to newMessage events
+    expose_timings: bool = False
+    # identifies the reply queue of this API replica
+    instance_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     model_config = SettingsConfigDict(env_prefix="APP_")
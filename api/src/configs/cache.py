@@ -0,0 +1,21 @@
+from pydantic_settings import SettingsConfigDict
+
+from src.configs.base import BaseApplicationSettings
+
+
+class CacheSettings(BaseApplicationSettings):
+    max_size: int = 10000
+    ttl: float = 3600
+    negative_ttl: float = 10
+    # serve results of the closest cached spelling ("beatles - hey jude (remastered)")
+    fuzzy_enabled: bool = True
+    # minimal trigram similarities (0..1) of the title and of the artist of a fuzzy match
+    fuzzy_title_threshold: float = 0.9
+    fuzzy_artist_threshold: float = 0.85
+    # songs compared at most per fuzzy search, titles with more similar ones get no fuzzy match
+    fuzzy_max_candidates: int = 1000
+    # results loaded into the fuzzy index per database query
+    fuzzy_batch_size: int = 1000
+    # seconds between loading results saved by other API instances into the fuzzy index
+    fuzzy_refresh_interval: float = 60
+    model_config = SettingsConfigDict(env_prefix="CACHE_")
@@ -6,4 +6,7 @@ from src.configs.base import BaseApplicationSettings
 class RabbitSettings(BaseApplicationSettings):
     url: str
     queue_prefix: str = "song"
+    publisher_pool_size: int = 4
+    # codec of outgoing messages: json or msgpack
+    codec: str = "json"
     model_config = SettingsConfigDict(env_prefix="RABBIT_")
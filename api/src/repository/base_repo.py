@@ -9,5 +9,14 @@ class IDatabaseRepository(ABC):
     @abstractmethod
     def find_one(self, **kwargs): ...
 
+    @abstractmethod
+    def find_many(self, **kwargs): ...
+
     @abstractmethod
     def insert_one(self, **kwargs): ...
+
+    @abstractmethod
+    def update_one(self, **kwargs): ...
+
+    @abstractmethod
+    def create_index(self, **kwargs): ...
@@ -31,6 +31,16 @@ class MongodbRepository(IDatabaseRepository):
             raise
 
 
+    async def find_many(self, collection_name: str, query: dict, projection: dict | None = None,
+                        sort: list[tuple[str, int]] | None = None, limit: int = 0):
+        try:
+            cursor = self.__db[collection_name].find(query, projection=projection or {"_id": False},
+                                                     sort=sort, limit=limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            self.logger.error(f"Error searching the documents:\n{e}")
+            raise
+
     async def insert_one(self, collection_name: str, document: dict):
         try:
             result = await self.__db[collection_name].insert_one(document)
@@ -39,6 +49,18 @@ class MongodbRepository(IDatabaseRepository):
             self.logger.error(f"Error adding the document:\n{e}")
             raise
 
+    async def update_one(self, collection_name: str, query: dict, update: dict, upsert: bool = False):
+        try:
+            result = await self.__db[collection_name].update_one(query, update, upsert=upsert)
+            return result
+        except Exception as e:
+            self.logger.error(f"Error updating the document:\n{e}")
+            raise
 
-
-
+    async def create_index(self, collection_name: str, keys: list[tuple[str, int]], **kwargs):
+        try:
+            result = await self.__db[collection_name].create_index(keys, **kwargs)
+            return result
+        except Exception as e:
+            self.logger.error(f"Error creating the index:\n{e}")
+            raise
@@ -0,0 +1,163 @@
+import math
+import re
+import unicodedata
+from array import array
+from dataclasses import dataclass
+
+
+# "feat. X", "ft X", "(featuring X)" up to the end of the field
+FEATURING_RE = re.compile(r"[\(\[]?\b(feat|ft|featuring)\b\.?.*$")
+# "(Remastered 2015)", "[Live]"
+BRACKETS_RE = re.compile(r"[\(\[\{][^\)\]\}]*[\)\]\}]")
+# "- Remastered 2009", "- Radio Edit", "- Live at Wembley"
+VERSION_SUFFIX_RE = re.compile(
+    r"\s[-–—]\s+(\d{4}\s+)?"
+    r"(remaster(ed)?|live|version|edit|mix|mono|stereo|demo|acoustic|radio|single|deluxe|bonus|original)\b.*$"
+)
+APOSTROPHES_RE = re.compile(r"['’`]")
+PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+NUMBERS_RE = re.compile(r"\d+")
+# bounds derived from a threshold must not exclude songs exactly at the threshold
+FLOAT_TOLERANCE = 1e-9
+
+
+def _fold(value: str) -> str:
+    """Casefold and drop diacritics"""
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def strip_decorations(value: str) -> str:
+    """
+    Reduce a user spelling of an artist or a title to its core words:
+    'The Beatles — Hey Jude (Remastered 2015)' -> 'the beatles hey jude'
+    """
+    value = _fold(value)
+    value = FEATURING_RE.sub("", value)
+    value = BRACKETS_RE.sub(" ", value)
+    value = VERSION_SUFFIX_RE.sub("", value)
+    value = APOSTROPHES_RE.sub("", value.replace("&", " and "))
+    return " ".join(PUNCTUATION_RE.sub(" ", value).split())
+
+
+def fuzzy_artist(artist: str) -> str:
+    artist = strip_decorations(artist)
+    return artist[4:] if artist.startswith("the ") else artist
+
+
+def trigrams(text: str) -> set[str]:
+    """Word trigrams padded like pg_trgm does, so short words and word starts weigh more"""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def dice(first: set[str], second: set[str]) -> float:
+    if not first and not second:
+        return 1.0
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+@dataclass(frozen=True)
+class FuzzyMatch:
+    key: tuple[str, str]
+    score: float
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index of the songs that have cached results.
+    Songs are indexed by the song_key of their result document. The stripped artist and title are
+    compared separately by the Dice coefficient of their trigram sets and each has to reach its own
+    threshold, so a long artist name cannot hide a different title ('Prince - Kiss' and 'Prince - Kiss Me').
+    Candidates with different numbers ('Song 2' and 'Song 3') never match.
+
+    Only title trigrams are indexed. A title reaching the threshold has to share at least a known share
+    of the query trigrams, so it is enough to look up the rarest of them (prefix filtering) and the
+    common trigrams ('  t', 'the') that list a large part of the catalog are never scanned.
+    """
+
+    def __init__(self, max_candidates: int = 1000):
+        """
+        :param max_candidates: songs compared at most per search, a search with more candidates finds no match
+        """
+        self.max_candidates = max_candidates
+        self._keys: list[tuple[str, str]] = []
+        self._artists: list[str] = []
+        self._titles: list[str] = []
+        self._sizes = array("H")
+        self._ids: dict[tuple[str, str], int] = {}
+        self._exact: dict[tuple[str, str], int] = {}
+        self._postings: dict[str, array] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key: tuple[str, str], artist: str, title: str):
+        if key in self._ids:
+            return
+        artist, title = fuzzy_artist(artist), strip_decorations(title)
+        grams = trigrams(title)
+        if not grams:
+            return
+        song_id = len(self._keys)
+        self._keys.append(key)
+        self._artists.append(artist)
+        self._titles.append(title)
+        self._sizes.append(min(len(grams), 0xFFFF))
+        self._ids[key] = song_id
+        self._exact.setdefault((artist, title), song_id)
+        for gram in grams:
+            self._postings.setdefault(gram, array("I")).append(song_id)
+
+    def _numbers(self, song_id: int) -> list[str]:
+        return NUMBERS_RE.findall(f"{self._artists[song_id]} {self._titles[song_id]}")
+
+    def _candidates(self, grams: set[str], threshold: float) -> set[int]:
+        # Dice >= threshold needs at least threshold * len(grams) / (2 - threshold) shared trigrams,
+        # so every such title contains one of the len(grams) - shared + 1 rarest query trigrams
+        shared = math.ceil(threshold * len(grams) / (2 - threshold) - FLOAT_TOLERANCE)
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        candidates = set()
+        for song_ids in postings[:max(len(grams) - shared + 1, 1)]:
+            candidates.update(song_ids)
+        return candidates
+
+    def search(self, artist: str, title: str, title_threshold: float, artist_threshold: float) -> FuzzyMatch | None:
+        """
+        :return: the most similar indexed song if the similarities (0..1) of both its title and artist
+            reach the thresholds. The score of the match is the lower of the two
+        """
+        artist, title = fuzzy_artist(artist), strip_decorations(title)
+        song_id = self._exact.get((artist, title))
+        if song_id is not None:
+            return FuzzyMatch(key=self._keys[song_id], score=1.0)
+
+        title_grams = trigrams(title)
+        if not title_grams:
+            return None
+        candidates = self._candidates(title_grams, title_threshold)
+        if len(candidates) > self.max_candidates:
+            return None
+
+        # titles too short or too long to reach the threshold whatever they share
+        min_size = title_threshold * len(title_grams) / (2 - title_threshold) - FLOAT_TOLERANCE
+        max_size = (2 - title_threshold) * len(title_grams) / title_threshold + FLOAT_TOLERANCE
+        artist_grams = trigrams(artist)
+        numbers = NUMBERS_RE.findall(f"{artist} {title}")
+        best = None
+        for song_id in candidates:
+            if not min_size <= self._sizes[song_id] <= max_size:
+                continue
+            title_score = dice(title_grams, trigrams(self._titles[song_id]))
+            if title_score < title_threshold or self._numbers(song_id) != numbers:
+                continue
+            artist_score = dice(artist_grams, trigrams(self._artists[song_id]))
+            if artist_score < artist_threshold:
+                continue
+            score = min(title_score, artist_score)
+            if best is None or score > best.score:
+                best = FuzzyMatch(key=self._keys[song_id], score=score)
+        return best
@@ -0,0 +1,99 @@
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class Waiter:
+    chat_id: str
+    message_id: str
+
+
+@dataclass
+class InFlightEntry:
+    leader: Waiter
+    waiters: list[Waiter] = field(default_factory=list)
+    artist: str = ""
+    title: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class InFlightRegistry:
+    """
+    Registry of recognition requests that were published to the worker and are waiting for an answer.
+    Requests for the same song are coalesced: only the first one (leader) is published,
+    the rest are attached as waiters and receive the leader's response.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[tuple[str, str], InFlightEntry] = {}
+        self._leaders: dict[Waiter, tuple[str, str]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def join(self, key: tuple[str, str], chat_id: str, message_id: str, artist: str = "", title: str = "") -> bool:
+        """
+        Attach request to the in-flight entry of the song.
+        :param artist, title: spelling of the song used in the errors sent to the waiters
+        :return: True if the caller became the leader and has to publish the request
+        """
+        waiter = Waiter(chat_id=chat_id, message_id=message_id)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created_at < self.ttl:
+            entry.waiters.append(waiter)
+            return False
+
+        # Entry is missing or expired (the worker has probably lost the job): publish again,
+        # keeping everyone who is still waiting for this song
+        waiters = entry.waiters if entry is not None else []
+        if entry is not None:
+            self._leaders.pop(entry.leader, None)
+        waiters.append(waiter)
+        self._entries[key] = InFlightEntry(leader=waiter, waiters=waiters, artist=artist, title=title)
+        self._leaders[waiter] = key
+        return True
+
+    def waiters(self, chat_id: str, message_id: str) -> list[Waiter]:
+        """Waiters of the request published by the given leader"""
+        key = self._leaders.get(Waiter(chat_id=chat_id, message_id=message_id))
+        if key is None:
+            return []
+        return list(self._entries[key].waiters)
+
+    def resolve(self, chat_id: str, message_id: str) -> list[Waiter]:
+        """Remove the request published by the given leader and return its waiters"""
+        key = self._leaders.pop(Waiter(chat_id=chat_id, message_id=message_id), None)
+        if key is None:
+            return []
+        return self._entries.pop(key).waiters
+
+    def expire(self) -> list[tuple[tuple[str, str], InFlightEntry]]:
+        """
+        Remove the requests that have waited for their response longer than ttl
+        (the broker has dropped the job or the worker has lost it).
+        :return: song keys and entries of the removed requests
+        """
+        now = time.monotonic()
+        expired = []
+        for key, entry in list(self._entries.items()):
+            if now - entry.created_at >= self.ttl:
+                del self._entries[key]
+                self._leaders.pop(entry.leader, None)
+                expired.append((key, entry))
+        return expired
+
+    def abandon(self, chat_id: str) -> list[tuple[tuple[str, str], Waiter]]:
+        """
+        Detach all waiters of the chat (e.g. its last websocket was closed).
+        Requests left without waiters are removed.
+        :return: song keys and leaders of the removed requests
+        """
+        abandoned = []
+        for key, entry in list(self._entries.items()):
+            entry.waiters = [waiter for waiter in entry.waiters if waiter.chat_id != chat_id]
+            if not entry.waiters:
+                del self._entries[key]
+                self._leaders.pop(entry.leader, None)
+                abandoned.append((key, entry.leader))
+        return abandoned
@@ -0,0 +1,11 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+cache_requests = Counter("api_cache_requests_total", "Result lookups by outcome", ["result"])
+cache_lookup_seconds = Histogram("api_cache_lookup_seconds", "Result lookup time in MongoDB")
+publish_seconds = Histogram("api_publish_seconds", "Time to publish a request and get the broker confirm")
+delivery_seconds = Histogram("api_ws_delivery_seconds", "Time to write a frame to a websocket")
+failures = Counter("api_failures_total", "Failures by stage", ["stage"])
+in_flight_requests = Gauge("api_in_flight_requests", "Requests published to the worker and waiting for an answer")
+open_websockets = Gauge("api_open_websockets", "Open websocket connections")
+evicted_websockets = Counter("api_evicted_websockets_total", "Websockets closed as slow consumers")
@@ -0,0 +1,116 @@
+import asyncio
+import json
+from collections import deque
+from typing import Hashable
+
+from starlette.websockets import WebSocket, WebSocketState
+
+from src.utils.metrics import delivery_seconds, failures, evicted_websockets
+from common_utils.log_util import setup_file_logger
+
+
+logger = setup_file_logger(
+    name="ws_connection_logger", log_file="ws_connection_logger.log")
+
+# Close code sent to clients that do not read their messages fast enough
+TRY_AGAIN_LATER = 1013
+
+
+class WsConnection:
+    """
+    Accepted websocket with a bounded outbound queue drained by a single writer task.
+    Producers never wait for the socket: frames are queued, and once `max_queue` frames are pending,
+    frames with a coalesce key (status updates) replace the pending frame with the same key or are dropped.
+    A connection with more than `high_water` pending frames, or with a send that exceeds
+    `send_timeout`, is considered a slow consumer and closed.
+    """
+
+    def __init__(self, websocket: WebSocket, chat_id: str, max_queue: int, high_water: int, send_timeout: float):
+        self.websocket = websocket
+        self.chat_id = chat_id
+        self.max_queue = max_queue
+        self.high_water = high_water
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._queue: deque[list] = deque()
+        self._pending: dict[Hashable, list] = {}
+        self._ready = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        # close handshake of an evicted client, referenced so that it is not garbage collected
+        self._closing: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write())
+
+    async def send_text(self, data: str, coalesce_key: Hashable | None = None):
+        if self.closed:
+            return
+        if coalesce_key is not None and len(self._queue) >= self.max_queue:
+            entry = self._pending.get(coalesce_key)
+            if entry is not None:
+                entry[1] = data
+            else:
+                logger.info(f"{self.chat_id}\tOutbound queue is full, dropping {coalesce_key}")
+            return
+        entry = [coalesce_key, data]
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = entry
+        self._ready.set()
+        if len(self._queue) > self.high_water:
+            logger.error(f"{self.chat_id}\tOutbound queue exceeded {self.high_water} frames, evicting the client")
+            evicted_websockets.inc()
+            self._evict()
+
+    async def send_json(self, data: dict, coalesce_key: Hashable | None = None):
+        await self.send_text(json.dumps(data), coalesce_key=coalesce_key)
+
+    async def _write(self):
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                coalesce_key, data = entry = self._queue.popleft()
+                if coalesce_key is not None and self._pending.get(coalesce_key) is entry:
+                    del self._pending[coalesce_key]
+                try:
+                    with delivery_seconds.time():
+                        await asyncio.wait_for(self.websocket.send_text(data), timeout=self.send_timeout)
+                except Exception as exc:
+                    logger.error(f"{self.chat_id}\tFailed to deliver message, evicting the client: {exc!r}")
+                    failures.labels("delivery").inc()
+                    evicted_websockets.inc()
+                    self._evict()
+                    return
+            self._ready.clear()
+
+    def _stop(self):
+        self.closed = True
+        self._queue.clear()
+        self._pending.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    def _evict(self):
+        """Close a slow client without making the producer or the writer wait for the close handshake"""
+        if self.closed:
+            return
+        self._stop()
+        self._closing = asyncio.create_task(self._close_websocket(TRY_AGAIN_LATER))
+
+    async def close(self, code: int | None = None):
+        """Stop the writer. If a close code is given, the websocket is closed as well"""
+        if self.closed:
+            return
+        self._stop()
+        if code is not None:
+            await self._close_websocket(code)
+
+    async def _close_websocket(self, code: int):
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await self.websocket.close(code=code)
+            except Exception as exc:
+                logger.error(f"{self.chat_id}\tFailed to close websocket: {exc!r}")
@@ -1,5 +1,5 @@
 from collections import defaultdict
-from starlette.websockets import WebSocket
+from src.utils.ws_connection import WsConnection
 from typing import Dict
 from fastapi import FastAPI
 import asyncio
@@ -13,6 +13,6 @@ class BotFastAPI(FastAPI):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.opened_ws: dict[str, list[WebSocket]] = defaultdict(list)
+        self.opened_ws: dict[str, list[WsConnection]] = defaultdict(list)
         self.tasks: Dict[str, dict] = defaultdict(dict)
         self.scheduled_tasks: Dict[str, asyncio.Task] = {}
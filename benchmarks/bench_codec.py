@@ -0,0 +1,80 @@
+"""
+Microbenchmark of the broker message codecs.
+
+Usage: python benchmarks/bench_codec.py [--number 20000] [--rate 2000]
+
+Compares the previous decoding path (json.loads, a throwaway Message to read the type, then the
+concrete class) with the single-pass JSON and msgpack codecs and reports the CPU time per message
+and the share of one core spent on (de)serialization at the given message rate.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "api"))
+
+from common_utils.schemas import (  # noqa: E402
+    CODECS,
+    MESSAGE_TYPE_TO_CLASS,
+    Message,
+    ResponseMessage,
+    StatusMessage,
+    UserMessage,
+)
+
+
+MESSAGES = [
+    UserMessage(chat_id="8d7d0d1c-3b9f-4d0e-9a8e-4f3b0e0c1a11", message_id="1", artist="The Beatles", title="Hey Jude"),
+    StatusMessage(chat_id="8d7d0d1c-3b9f-4d0e-9a8e-4f3b0e0c1a11", user_message_id="1", text="Waiting for response..."),
+    ResponseMessage(
+        chat_id="8d7d0d1c-3b9f-4d0e-9a8e-4f3b0e0c1a11", user_message_id="1",
+        response="The song encourages someone to overcome fear and embrace love.",
+        countries=["United Kingdom"], title="Hey Jude", artist="The Beatles",
+    ),
+]
+
+
+def legacy_encode(message: Message) -> bytes:
+    return message.model_dump_json().encode("utf-8")
+
+
+def legacy_decode(body: bytes) -> Message:
+    message_dict = json.loads(body.decode("utf-8"))
+    message_type = Message(**message_dict).type
+    return MESSAGE_TYPE_TO_CLASS[message_type](**message_dict)
+
+
+def measure(func, payloads: list, number: int) -> float:
+    """CPU seconds per call"""
+    start = time.process_time()
+    for i in range(number):
+        func(payloads[i % len(payloads)])
+    return (time.process_time() - start) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Number of messages per measurement")
+    parser.add_argument("--rate", type=float, default=2000, help="Messages per second used to estimate CPU share")
+    args = parser.parse_args()
+
+    variants = {"legacy json": (legacy_encode, legacy_decode)}
+    for name, codec in CODECS.items():
+        variants[name] = (codec.encode, codec.decode)
+
+    print(f"{'codec':<12} {'encode us':>10} {'decode us':>10} {'size B':>8} {'CPU % at rate':>14}")
+    for name, (encode, decode) in variants.items():
+        bodies = [encode(message) for message in MESSAGES]
+        for body, message in zip(bodies, MESSAGES):
+            assert decode(body) == message, name
+        encode_time = measure(encode, MESSAGES, args.number)
+        decode_time = measure(decode, bodies, args.number)
+        size = sum(len(body) for body in bodies) / len(bodies)
+        cpu_share = (encode_time + decode_time) * args.rate * 100
+        print(f"{name:<12} {encode_time * 1e6:>10.2f} {decode_time * 1e6:>10.2f} {size:>8.0f} {cpu_share:>13.2f}%")
+
+
+if __name__ == "__main__":
+    main()
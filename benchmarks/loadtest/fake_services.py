@@ -0,0 +1,138 @@
+"""
+Local stand-ins for the OpenAI chat-completions endpoint and the lyrics API.
+
+Usage: python benchmarks/loadtest/fake_services.py [--port 8900] [--llm-latency 0.8] [--llm-jitter 0.4]
+                                                   [--llm-error-rate 0.01] [--lyrics-latency 0.2]
+                                                   [--lyrics-error-rate 0.02] [--lyrics-miss-rate 0.05]
+
+Both fakes run in one aiohttp app. Point the worker at them with
+    AI_BASE_URL=http://127.0.0.1:8900/v1 AI_BACKEND=openai RECOGNIZE_LYRICS_URL=http://127.0.0.1:8900/lyrics
+Latencies are drawn uniformly from [latency - jitter, latency + jitter]; failed calls answer 500 for the LLM
+and 503 for the lyrics API, misses answer 404 like lyrics.ovh does for unknown songs.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+COUNTRIES = ["France", "Italy", "Japan", "Brazil", "United Kingdom", "Mexico", "Canada"]
+LYRICS_LINE = "I walked the roads from Paris down to Rome and back again "
+
+
+class FakeServices:
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.requests = {"llm": 0, "lyrics": 0}
+        self.errors = {"llm": 0, "lyrics": 0}
+
+    @staticmethod
+    async def _delay(latency: float, jitter: float):
+        await asyncio.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)))
+
+    def _fail(self, service: str, rate: float) -> bool:
+        self.requests[service] += 1
+        if random.random() < rate:
+            self.errors[service] += 1
+            return True
+        return False
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        await self._delay(self.args.llm_latency, self.args.llm_jitter)
+        if self._fail("llm", self.args.llm_error_rate):
+            return web.json_response({"error": {"message": "fake upstream error", "type": "server_error"}},
+                                     status=500)
+
+        system_message = next((m["content"] for m in body["messages"] if m["role"] == "system"), "")
+        countries = random.sample(COUNTRIES, k=random.randint(0, 2))
+        summary = "The song is about a long journey home and the people left behind."
+        if (body.get("response_format") or {}).get("type") in ("json_object", "json_schema"):
+            content = json.dumps({"summary": summary, "countries": countries})
+        elif "LIST" in system_message:
+            content = json.dumps(countries)
+        else:
+            content = summary
+
+        if body.get("stream"):
+            return await self._stream_completion(request, body, content)
+        return web.json_response({
+            "id": f"chatcmpl-fake-{self.requests['llm']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": 200, "completion_tokens": 30, "total_tokens": 230},
+        })
+
+    async def _stream_completion(self, request: web.Request, body: dict, content: str) -> web.StreamResponse:
+        """Server-sent events like the streamed chat completion, one word per chunk"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = content.split(" ")
+        for number, word in enumerate(words):
+            chunk = {
+                "id": f"chatcmpl-fake-{self.requests['llm']}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if number == 0 else f" {word}"},
+                    "finish_reason": "stop" if number == len(words) - 1 else None,
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await self._delay(self.args.token_latency, 0)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def lyrics(self, request: web.Request) -> web.Response:
+        await self._delay(self.args.lyrics_latency, self.args.lyrics_jitter)
+        if self._fail("lyrics", self.args.lyrics_error_rate):
+            return web.json_response({"error": "fake upstream error"}, status=503)
+        if random.random() < self.args.lyrics_miss_rate:
+            return web.json_response({"error": "No lyrics found"}, status=404)
+        return web.json_response({"lyrics": LYRICS_LINE * self.args.lyrics_lines})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": self.requests, "errors": self.errors})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/lyrics/{artist}/{title}", self.lyrics)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="mean seconds per chat completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.4)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.05,
+                        help="seconds between the chunks of a streamed completion (AI_STREAMING=true)")
+    parser.add_argument("--lyrics-latency", type=float, default=0.2, help="mean seconds per lyrics request")
+    parser.add_argument("--lyrics-jitter", type=float, default=0.1)
+    parser.add_argument("--lyrics-error-rate", type=float, default=0.0)
+    parser.add_argument("--lyrics-miss-rate", type=float, default=0.0, help="share of songs without lyrics")
+    parser.add_argument("--lyrics-lines", type=int, default=40, help="size of the returned lyrics")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(FakeServices(args).create_app(), host=args.host, port=args.port)
@@ -0,0 +1,250 @@
+"""
+Websocket load generator for the api.
+
+Usage: python benchmarks/loadtest/ws_load.py --url http://127.0.0.1:7777 --token $APP_TOKEN
+                                             [--clients 50] [--requests 20] [--hit-ratio 0.7]
+                                             [--traffic songs.jsonl] [--pid API_PID --pid WORKER_PID]
+
+Every client authorizes through /ws_auth, opens /ws/{chat_id} and sends recognizeSong requests one after
+another, waiting for the newMessage answer of each one. Songs come from --traffic (one JSON object with
+"artist" and "title" per line) or from a built-in list. Before the run the songs are requested once so that
+they are cached; during the run a request repeats one of them with probability --hit-ratio and otherwise
+asks for a song that was never seen. The report has the throughput, latency percentiles of hits and misses
+and, for every --pid, the CPU time and resident memory of that process during the run (Linux /proc only).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aiohttp
+
+
+DEFAULT_SONGS = [
+    {"artist": "The Beatles", "title": "Hey Jude"},
+    {"artist": "Queen", "title": "Bohemian Rhapsody"},
+    {"artist": "Adele", "title": "Hello"},
+    {"artist": "Nirvana", "title": "Smells Like Teen Spirit"},
+    {"artist": "Eagles", "title": "Hotel California"},
+    {"artist": "ABBA", "title": "Dancing Queen"},
+    {"artist": "Coldplay", "title": "Viva la Vida"},
+    {"artist": "Shakira", "title": "Hips Don't Lie"},
+]
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: {"hit": [], "miss": []})
+    errors: int = 0
+    timeouts: int = 0
+
+
+def load_songs(path: str | None) -> list[dict]:
+    if not path:
+        return DEFAULT_SONGS
+    songs = []
+    for line in Path(path).read_text().splitlines():
+        if line.strip():
+            record = json.loads(line)
+            songs.append({"artist": record["artist"], "title": record["title"]})
+    return songs
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class ProcessSampler:
+    """Samples CPU time and resident memory of the given processes"""
+
+    def __init__(self, pids: list[int], interval: float = 0.5):
+        self.pids = pids
+        self.interval = interval
+        self.start_cpu: dict[int, float] = {}
+        self.peak_rss: dict[int, int] = {pid: 0 for pid in pids}
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _cpu_seconds(pid: int) -> float:
+        # fields after the command name, which may contain spaces
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+    @staticmethod
+    def _rss_bytes(pid: int) -> int:
+        return int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * PAGE_SIZE
+
+    async def _sample(self):
+        while True:
+            for pid in self.pids:
+                self.peak_rss[pid] = max(self.peak_rss[pid], self._rss_bytes(pid))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.start_cpu = {pid: self._cpu_seconds(pid) for pid in self.pids}
+        self._task = asyncio.create_task(self._sample())
+
+    def stop(self, elapsed: float) -> dict[int, dict]:
+        if self._task is not None:
+            self._task.cancel()
+        report = {}
+        for pid in self.pids:
+            cpu = self._cpu_seconds(pid) - self.start_cpu[pid]
+            report[pid] = {
+                "cpu_seconds": round(cpu, 2),
+                "cpu_utilization": round(cpu / elapsed, 3),
+                "peak_rss_mb": round(self.peak_rss[pid] / 2 ** 20, 1),
+            }
+        return report
+
+
+class LoadClient:
+
+    def __init__(self, session: aiohttp.ClientSession, args: argparse.Namespace, results: Results):
+        self.session = session
+        self.args = args
+        self.results = results
+        self.chat_id = str(uuid.uuid4())
+        self.ws: aiohttp.ClientWebSocketResponse | None = None
+
+    async def connect(self):
+        headers = {"Authorization": f"Bearer {self.args.token}"}
+        async with self.session.post(f"{self.args.url}/ws_auth", headers=headers,
+                                     json={"user_id": self.chat_id, "chat_id": self.chat_id}) as response:
+            response.raise_for_status()
+            ws_url = (await response.json())["ws_url"]
+        self.ws = await self.session.ws_connect(self.args.url.replace("http", "ws", 1) + ws_url, headers=headers)
+
+    async def request(self, song: dict) -> float | None:
+        """Sends one recognizeSong request and returns the seconds until its newMessage event"""
+        message_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        await self.ws.send_json({"method": "recognizeSong", "id": message_id, **song})
+        try:
+            async with asyncio.timeout(self.args.timeout):
+                async for frame in self.ws:
+                    if frame.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    data = json.loads(frame.data)
+                    if isinstance(data, dict) and data.get("event") == "newMessage":
+                        if data["data"]["user_message_id"] == message_id:
+                            return time.perf_counter() - started
+                    elif not isinstance(data, dict) or "error" in data:
+                        self.results.errors += 1
+                        return None
+        except TimeoutError:
+            self.results.timeouts += 1
+            return None
+        self.results.errors += 1
+        return None
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+async def warm_cache(session: aiohttp.ClientSession, args: argparse.Namespace, songs: list[dict]):
+    client = LoadClient(session, args, Results())
+    await client.connect()
+    try:
+        for song in songs:
+            await client.request(song)
+    finally:
+        await client.close()
+
+
+async def run_client(session: aiohttp.ClientSession, args: argparse.Namespace, songs: list[dict],
+                     results: Results):
+    client = LoadClient(session, args, results)
+    try:
+        await client.connect()
+    except (aiohttp.ClientError, OSError):
+        results.errors += args.requests
+        return
+    try:
+        for _ in range(args.requests):
+            if random.random() < args.hit_ratio:
+                kind, song = "hit", random.choice(songs)
+            else:
+                kind, song = "miss", {"artist": f"Load Test {uuid.uuid4().hex[:8]}", "title": random.choice(songs)["title"]}
+            latency = await client.request(song)
+            if latency is not None:
+                results.latencies[kind].append(latency)
+    finally:
+        await client.close()
+
+
+def print_report(args: argparse.Namespace, results: Results, elapsed: float, resources: dict[int, dict]):
+    completed = sum(len(values) for values in results.latencies.values())
+    report = {
+        "clients": args.clients,
+        "hit_ratio": args.hit_ratio,
+        "elapsed_seconds": round(elapsed, 2),
+        "completed": completed,
+        "errors": results.errors,
+        "timeouts": results.timeouts,
+        "throughput_rps": round(completed / elapsed, 2),
+        "latency_ms": {},
+        "resources": resources,
+    }
+    for kind, values in results.latencies.items():
+        if values:
+            report["latency_ms"][kind] = {
+                "count": len(values),
+                "mean": round(statistics.fmean(values) * 1000, 1),
+                **{f"p{int(share * 100)}": round(percentile(values, share) * 1000, 1)
+                   for share in (0.5, 0.9, 0.95, 0.99)},
+                "max": round(max(values) * 1000, 1),
+            }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{completed} requests in {elapsed:.1f}s from {args.clients} clients: {report['throughput_rps']} req/s, "
+          f"{results.errors} errors, {results.timeouts} timeouts")
+    for kind, stats in report["latency_ms"].items():
+        print(f"{kind:>5} latency, ms: " + "  ".join(f"{name} {value}" for name, value in stats.items()))
+    for pid, usage in resources.items():
+        print(f"pid {pid}: cpu {usage['cpu_seconds']}s ({usage['cpu_utilization'] * 100:.0f}% of a core), "
+              f"peak rss {usage['peak_rss_mb']} MB")
+
+
+async def main(args: argparse.Namespace):
+    songs = load_songs(args.traffic)
+    sampler = ProcessSampler(args.pid)
+    results = Results()
+    async with aiohttp.ClientSession() as session:
+        if args.hit_ratio > 0:
+            await warm_cache(session, args, songs)
+        sampler.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(run_client(session, args, songs, results) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - started
+    print_report(args, results, elapsed, sampler.stop(elapsed))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:7777", help="base url of the api")
+    parser.add_argument("--token", default=os.getenv("APP_TOKEN", ""))
+    parser.add_argument("--clients", type=int, default=50, help="concurrent websocket clients")
+    parser.add_argument("--requests", type=int, default=20, help="requests sent by every client")
+    parser.add_argument("--hit-ratio", type=float, default=0.7, help="share of requests for already cached songs")
+    parser.add_argument("--traffic", help="jsonl file with artist/title objects to replay")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for one answer")
+    parser.add_argument("--pid", type=int, action="append", default=[], help="process to measure (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))